@@ -0,0 +1,118 @@
+import os
+import datetime
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+import toml
+
+from AutoOBS.const import (
+    CONF_FILE,
+    LISTENER_TIMER_TIME,
+    COUNTER_BOUND,
+    OBS_RECONCILE_INTVL,
+    OBS_BACKEND,
+    OBS_BACKENDS,
+    OBS_COMMAND_DEADLINE,
+)
+from AutoOBS.utils import StopSchedule
+
+
+class ConfError(Exception):
+    """conf.toml is missing or wrong, the message is shown to the user"""
+
+
+class Target(NamedTuple):
+    name: str
+    host: str
+    port: int
+    pw: str
+    backend: str
+    timeouts: Mapping[str, float]
+    command_deadline: float
+
+
+class Settings(NamedTuple):
+    """conf.toml parsed and validated, never changed, a reload makes a new one"""
+    targets: Tuple[Target, ...]
+    listener_timer_time: int
+    counter_bound: int
+    reconcile_interval: int
+    stop_schedule: StopSchedule
+    control_socket: Optional[str]
+    metrics_port: Optional[int]
+
+
+# settings the running threads and sockets are built from, a change of them
+# needs a restart
+RESTART_SETTINGS = ("targets", "reconcile_interval", "control_socket", "metrics_port")
+
+
+def _positive(key: str, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ConfError("Configuration \"{}\" must be a positive number, not {!r}!".format(key, value))
+    return value
+
+
+def _port(key: str, value):
+    if value is not None and (isinstance(value, bool) or not isinstance(value, int)
+                              or not 0 < value < 65536):
+        raise ConfError("Configuration \"{}\" must be a port number, not {!r}!".format(key, value))
+    return value
+
+
+def load_conf(path: str = CONF_FILE) -> Settings:
+    if not os.path.isfile(path):
+        raise ConfError("Configuration file ({}) not found!".format(path))
+
+    try:
+        conf = toml.load(path)
+
+        # one [obs] table, or an [[obs]] array of tables for several OBS
+        obs_conf = conf["OBS"] if "OBS" in conf else conf["obs"]
+        if isinstance(obs_conf, dict):
+            obs_conf = [obs_conf]
+
+        targets = []
+        for target in obs_conf:
+            targets.append(Target(
+                name=target.get("name", "{}:{}".format(target["host"], target["port"])),
+                host=target["host"],
+                port=target["port"],
+                pw=target["password"],
+                backend=target.get("backend", OBS_BACKEND),
+                timeouts=MappingProxyType({name: _positive(name, timeout) for name, timeout
+                                           in target.get("timeouts", {}).items()}),
+                command_deadline=_positive("command_deadline",
+                                           target.get("command_deadline", OBS_COMMAND_DEADLINE)),
+            ))
+
+        auto_conf = conf.get("AutoOBS", {})
+        stop_times = auto_conf.get("stop_times", [])
+        if not (isinstance(stop_times, list)
+                and all(isinstance(item, datetime.time) for item in stop_times)):
+            raise ConfError("Configuration \"stop_times\" must be a list of times like 01:00:00!")
+
+        settings = Settings(
+            targets=tuple(targets),
+            listener_timer_time=_positive("listener_timer_time",
+                                          auto_conf.get("listener_timer_time", LISTENER_TIMER_TIME)),
+            counter_bound=_positive("counter_bound", auto_conf.get("counter_bound", COUNTER_BOUND)),
+            reconcile_interval=_positive("reconcile_interval",
+                                         auto_conf.get("reconcile_interval", OBS_RECONCILE_INTVL)),
+            stop_schedule=StopSchedule(stop_times),
+            control_socket=auto_conf.get("control_socket"),
+            metrics_port=_port("metrics_port", auto_conf.get("metrics_port")),
+        )
+    except toml.TomlDecodeError as e:
+        raise ConfError("TomlDecodeError: \"{}\"!".format(e.args[0]))
+    except KeyError as e:
+        raise ConfError("Configuration Key \"{}\" does not exist!".format(e.args[0]))
+
+    names = [target.name for target in targets]
+    backends = [target.backend for target in targets if target.backend not in OBS_BACKENDS]
+    if backends:
+        raise ConfError("Unknown OBS backend \"{}\"!".format(backends[0]))
+    if len(set(names)) != len(names):
+        raise ConfError("OBS names are not unique: {}!".format(", ".join(names)))
+
+    return settings
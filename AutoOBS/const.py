@@ -1,13 +1,53 @@
+import os
 from enum import IntEnum
 
 
 CONF_FILE = "conf.toml"
+# ms, quiet time after a change of conf.toml before it is reloaded
+CONF_RELOAD_DELAY = 200
 LOG_PATH = "./logs"
+# bytes, a log file is rotated and gzipped at this size, LOG_BACKUPS are kept
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+JOURNAL_FILE = os.path.join(LOG_PATH, "journal.bin")
+# records of 24 bytes in the journal ring, about a week of normal use
+JOURNAL_RECORDS = 65536
+# s, input events closer than this are one activity burst in the journal
+JOURNAL_BURST_GAP = 2
+# events kept by --trace, about 150 bytes each, the oldest are dropped
+TRACE_EVENTS = 200000
 DEBUG_FLAG = False
+# metrics are only served on the loopback interface
+METRICS_HOST = "127.0.0.1"
 
 LISTENER_TIMER_TIME = 100
-COUNTER_INTVL = 1
 COUNTER_BOUND = 10
+OBS_RECONCILE_INTVL = 60
+OBS_BACKEND = "obsws"
+OBS_BACKENDS = ("obsws", "asyncio", "v5")
+OBS_CALL_TIMEOUT = 60
+# s, a command still waiting for the obs thread after this is dropped
+OBS_COMMAND_DEADLINE = 5
+# s, request -> reply timeout, OBS_CALL_TIMEOUT for the others
+OBS_REQUEST_TIMEOUTS = {
+    "GetRecordingStatus": 5,
+    "PauseRecording": 5,
+    "ResumeRecording": 5,
+    "StartRecording": 15,
+    "StopRecording": 15,
+}
+OBS_QUEUE_LEN = 16
+OBS_QUEUE_EXPIRY = 30
+OBS_PING_INTVL = 10
+OBS_PING_TIMEOUT = 5
+OBS_BACKOFF_BASE = 0.5
+OBS_BACKOFF_MAX = 30
+
+# resumes kept for the rolling resume latency percentiles
+RESUME_LATENCY_WINDOW = 200
+# s, upper bounds of the obs-websocket latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
 
 class OBStatus(IntEnum):
     stopped = 0
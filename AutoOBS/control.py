@@ -0,0 +1,203 @@
+import sys
+import json
+import socket
+import logging
+import argparse
+from typing import Optional
+
+from PyQt5.QtCore import QObject, pyqtSlot
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+from AutoOBS.const import status_to_str
+from AutoOBS.tracing import tracer
+
+
+COMMANDS = ("start", "stop", "resume", "pause")
+
+
+class ControlServer(QObject):
+    """Local control socket, a Unix domain socket (a named pipe on Windows).
+
+    The protocol is one JSON value per line in both directions. A request is
+    an object like {"cmd": "pause"}, or an array of them which is answered
+    by one array of replies in the same order. An "id" in a request is
+    copied to its reply.
+
+    - status: mode, idle seconds, aggregated and per OBS status
+    - mode: switch to {"mode": "auto"} or "manual"
+    - start, stop, resume, pause: only in manual mode, like the buttons
+    - stats: the statistics snapshot
+    - trace: dump the trace of --trace, the reply holds the file name
+    - subscribe, unsubscribe: stream {"event": ...} lines on every change
+      of mode, OBS status, connection or activity
+    """
+
+    def __init__(self, engine, path: str, logger: logging.Logger) -> None:
+        super().__init__()
+
+        self.engine = engine
+        self.path = path
+        self.logger = logger
+
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_connection)
+        self.subscribers = set()
+        self.last_state = None
+
+    def listen(self) -> bool:
+        # left behind by a process that did not exit cleanly
+        QLocalServer.removeServer(self.path)
+        if not self.server.listen(self.path):
+            self.logger.error("Control socket {} failed: {}."
+                              .format(self.path, self.server.errorString()))
+            return False
+
+        self.engine.mode_sig.connect(lambda mode: self.notify("mode"))
+        self.engine.obs.ui_update_sig.connect(lambda status: self.notify("status"))
+        self.engine.obs.connect_wait_done_sig.connect(lambda ret: self.notify("connection"))
+        self.engine.listen_worker.active_sig.connect(lambda: self.notify("active"))
+        self.engine.count_worker.pause.connect(lambda: self.notify("idle"))
+        self.logger.info("Control socket listening on {}.".format(self.server.fullServerName()))
+        return True
+
+    def close(self) -> None:
+        self.server.close()
+
+    @pyqtSlot()
+    def on_connection(self) -> None:
+        while self.server.hasPendingConnections():
+            conn = self.server.nextPendingConnection()
+            conn.readyRead.connect(lambda conn=conn: self.on_ready_read(conn))
+            conn.disconnected.connect(lambda conn=conn: self.on_disconnected(conn))
+
+    def on_disconnected(self, conn: QLocalSocket) -> None:
+        self.subscribers.discard(conn)
+        conn.deleteLater()
+
+    def on_ready_read(self, conn: QLocalSocket) -> None:
+        while conn.canReadLine():
+            line = bytes(conn.readLine()).strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self._send(conn, {"ok": False, "error": "invalid JSON: {}".format(e)})
+                continue
+
+            if isinstance(request, list):
+                self._send(conn, [self.handle(item, conn) for item in request])
+            else:
+                self._send(conn, self.handle(request, conn))
+
+    def handle(self, request, conn: Optional[QLocalSocket] = None) -> dict:
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request is not an object"}
+
+        reply = {"ok": True}
+        if "id" in request:
+            reply["id"] = request["id"]
+
+        cmd = request.get("cmd")
+        if cmd == "status":
+            reply["state"] = self.state()
+        elif cmd == "mode":
+            mode = request.get("mode")
+            if mode not in ("auto", "manual"):
+                return dict(reply, ok=False, error="mode is \"auto\" or \"manual\"")
+            if mode != self.engine.run_mode:
+                self.engine.set_mode(mode)
+        elif cmd in COMMANDS:
+            if self.engine.run_mode != "manual":
+                return dict(reply, ok=False, error="{} needs manual mode".format(cmd))
+            self.engine.manual(cmd)
+        elif cmd == "stats":
+            reply["stats"] = self.engine.obs.snapshot()
+        elif cmd == "trace":
+            if not tracer.enabled:
+                return dict(reply, ok=False, error="trace needs --trace")
+            reply["trace"] = tracer.dump()
+        elif cmd == "subscribe":
+            self.subscribers.add(conn)
+            reply["state"] = self.state()
+        elif cmd == "unsubscribe":
+            self.subscribers.discard(conn)
+        else:
+            return dict(reply, ok=False, error="unknown cmd {!r}".format(cmd))
+        return reply
+
+    def state(self) -> dict:
+        obs = self.engine.obs
+        return {"mode": self.engine.run_mode,
+                "idle": self.engine.counter.idle_time,
+                "idle_bound": self.engine.counter.bound,
+                "status": status_to_str[obs.status],
+                "connected": obs.all_connected,
+                "obs": {name: {"status": status_to_str[worker.status], "connected": bool(connected)}
+                        for name, worker, connected in zip(obs.names, obs.workers, obs.connected)}}
+
+    # activity events are always sent, the others only when the state changed
+    def notify(self, event: str) -> None:
+        if not self.subscribers:
+            return
+
+        state = self.state()
+        idle = state.pop("idle")
+        if event not in ("active", "idle"):
+            if state == self.last_state:
+                return
+            self.last_state = state
+
+        message = dict(state, idle=idle, event=event)
+        for conn in list(self.subscribers):
+            self._send(conn, message)
+
+    @staticmethod
+    def _send(conn: QLocalSocket, message) -> None:
+        conn.write(json.dumps(message).encode("utf-8") + b"\n")
+        conn.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.control",
+                                     description="Send requests to the AutoOBS control socket.")
+    parser.add_argument("socket", help="path of the control socket")
+    parser.add_argument("requests", nargs="*",
+                        help="a cmd like status, pause or mode=manual, or a JSON request")
+    parser.add_argument("--watch", action="store_true",
+                        help="print notifications until interrupted")
+    args = parser.parse_args()
+
+    batch = []
+    for item in args.requests:
+        if item.startswith(("{", "[")):
+            batch.append(json.loads(item))
+        elif "=" in item:
+            cmd, value = item.split("=", 1)
+            batch.append({"cmd": cmd, cmd: value})
+        else:
+            batch.append({"cmd": item})
+    if args.watch:
+        batch.append({"cmd": "subscribe"})
+    if not batch:
+        parser.error("no requests")
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(args.socket)
+    conn.sendall(json.dumps(batch if len(batch) > 1 else batch[0]).encode("utf-8") + b"\n")
+
+    try:
+        for line in conn.makefile("r", encoding="utf-8"):
+            print(line, end="")
+            sys.stdout.flush()
+            if not args.watch:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import signal
+import socket
+import logging
+from typing import Optional
+
+from PyQt5.QtCore import QCoreApplication, QObject, QSocketNotifier, pyqtSlot
+
+from AutoOBS.const import status_to_str
+from AutoOBS.conf import Settings, load_conf, ConfError
+from AutoOBS.engine import Engine
+from AutoOBS.profiling import startup
+
+
+class Daemon(QObject):
+    """AutoOBS without a GUI, it only needs QtCore and no display.
+
+    Controlled by signals: SIGINT and SIGTERM quit, SIGHUP reloads conf.toml,
+    SIGUSR1 dumps the statistics and SIGUSR2 switches between auto and
+    manual mode.
+    """
+
+    def __init__(self, app: QCoreApplication, conf: Settings, logger: logging.Logger,
+                 startup_time: Optional[float] = None) -> None:
+        super().__init__()
+
+        self.app = app
+        self.logger = logger
+        self.engine = Engine(conf, logger, startup_time=startup_time)
+        self.status = None
+
+        # python signal handlers only run when the interpreter gets control,
+        # the wakeup fd gives it control from the Qt event loop
+        self.signal_rsock, self.signal_wsock = socket.socketpair()
+        self.signal_wsock.setblocking(False)
+        self.signal_notifier = QSocketNotifier(self.signal_rsock.fileno(), QSocketNotifier.Read)
+        self.signal_notifier.activated.connect(self.on_signal_wakeup)
+
+    def start(self) -> None:
+        signal.set_wakeup_fd(self.signal_wsock.fileno())
+        signal.signal(signal.SIGINT, self.on_quit_signal)
+        signal.signal(signal.SIGTERM, self.on_quit_signal)
+        # not on Windows
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda *_: self.engine.dump_stats())
+            signal.signal(signal.SIGUSR2, lambda *_: self.toggle_mode())
+            signal.signal(signal.SIGHUP, lambda *_: self.engine.reload())
+
+        self.engine.mode_sig.connect(lambda mode: self.logger.info("Run mode: {}.".format(mode)))
+        self.engine.obs_down_sig.connect(
+            lambda names: self.logger.warning("Can not connect to the OBS Studio ({}), retrying..."
+                                              .format(names)))
+        self.engine.start()
+        self.engine.obs.ui_update_sig.connect(self.on_status)
+        for thread in self.engine.threads:
+            thread.finished.connect(self.app.exit)
+
+    @pyqtSlot()
+    def on_signal_wakeup(self) -> None:
+        self.signal_rsock.recv(64)
+
+    def on_quit_signal(self, signum, frame) -> None:
+        self.logger.info("Got signal {}, quit.".format(signum))
+        self.app.quit()
+
+    def toggle_mode(self) -> None:
+        self.engine.set_mode("manual" if self.engine.run_mode == "auto" else "auto")
+
+    @pyqtSlot(int)
+    def on_status(self, status: int) -> None:
+        if status != self.status:
+            self.status = status
+            self.logger.info("OBS status: {}.".format(status_to_str[status]))
+
+
+def run(logger: logging.Logger, startup_time: float) -> int:
+    try:
+        with startup.phase("conf: load"):
+            conf = load_conf()
+    except ConfError as e:
+        logger.error(str(e))
+        print(e, file=sys.stderr)
+        return 1
+
+    with startup.phase("daemon: QCoreApplication"):
+        app = QCoreApplication(sys.argv)
+    daemon = Daemon(app, conf, logger, startup_time)
+    with startup.phase("daemon: start"):
+        daemon.start()
+    ret = app.exec()
+    daemon.engine.stop()
+    return ret
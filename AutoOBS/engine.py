@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import logging
+from typing import Optional
+
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal, pyqtSlot
+
+from AutoOBS.const import CONF_FILE, CONF_RELOAD_DELAY, LOG_PATH, JOURNAL_FILE, CONNECT_FAILED_RET
+from AutoOBS.conf import Settings, ConfError, load_conf, RESTART_SETTINGS
+from AutoOBS.worker import Counter, CountWorker, ListenWorker
+from AutoOBS.obs_group import ObsGroup
+from AutoOBS.profiling import startup
+from AutoOBS.journal import Journal
+from AutoOBS.tracing import tracer
+from AutoOBS.utils import peak_rss
+
+
+class Engine(QObject):
+    """Activity tracking and OBS control, everything but the GUI.
+
+    Window and the headless Daemon both drive AutoOBS through it. In auto
+    mode the counter pauses and resumes OBS, in manual mode only commands
+    from the user do.
+
+    conf.toml is watched, on a change the new settings replace the old ones
+    as a whole, see reload().
+    """
+
+    mode_sig = pyqtSignal(str)
+    # names of the OBS that are down, once when the connection goes down,
+    # not on every retry
+    obs_down_sig = pyqtSignal(str)
+    count_active_sig = pyqtSignal(bool)
+    schedule_sig = pyqtSignal(object)
+
+    def __init__(self, settings: Settings, logger: logging.Logger,
+                 conf_path: str = CONF_FILE, startup_time: Optional[float] = None) -> None:
+        super().__init__()
+
+        self.settings = settings
+        self.conf_path = conf_path
+        self.logger = logger
+        self.run_mode = None
+
+        self.journal = None
+        self.obs = None
+        self.counter = None
+        self.count_thread = None
+        self.count_worker = None
+        self.listen_thread = None
+        self.listen_worker = None
+        self.control = None
+        self.metrics = None
+
+        # perf_counter() at process start, the front end is interactive on
+        # the first pass of its event loop
+        self.startup_time = time.perf_counter() if startup_time is None else startup_time
+        self.interactive_time = None
+        self.connected_time = None
+        # None until the first connect attempt is done
+        self.obs_connected = None
+
+        # editors write a file in several steps, reload once they are done
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(lambda path: self.reload_timer.start())
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(CONF_RELOAD_DELAY)
+        self.reload_timer.timeout.connect(self.reload)
+
+    @property
+    def threads(self):
+        return self.obs.threads + [self.count_thread, self.listen_thread]
+
+    # nothing here waits for OBS: the connection is made in the obs threads
+    # while activity tracking starts, and commands issued before it is up
+    # are queued by ObsWorker
+    def start(self) -> None:
+        conf = self.settings
+
+        # always on, a write is a few stores into the mapped file
+        with startup.phase("engine: journal"):
+            try:
+                os.makedirs(LOG_PATH, exist_ok=True)
+                self.journal = Journal(JOURNAL_FILE)
+            except (OSError, ValueError) as e:
+                self.logger.warning("Journal {} not available, kept in memory: {}."
+                                    .format(JOURNAL_FILE, e))
+                self.journal = Journal(None)
+
+        # start obs threads, one per OBS
+        with startup.phase("engine: obs threads"):
+            self.obs = ObsGroup(conf.targets, conf.reconcile_interval, self.journal, self.logger)
+            self.obs.connect_wait_done_sig.connect(self.on_obs_connected)
+            self.obs.start_threads()
+
+        # set counter
+        self.counter = Counter(conf.counter_bound, self.logger)
+
+        # set count thread
+        begin = time.perf_counter()
+        self.count_thread = QThread()
+        self.count_worker = CountWorker(conf.stop_schedule, self.counter, self.journal,
+                                        self.logger)
+        self.count_worker.pause.connect(self.auto_pause)
+        self.count_worker.stop.connect(self.auto_stop)
+        self.count_active_sig.connect(self.count_worker.set_active)
+        self.schedule_sig.connect(self.count_worker.set_schedule)
+        self.count_worker.moveToThread(self.count_thread)
+        self.count_thread.started.connect(self.count_worker.run)
+        self.count_thread.finished.connect(self.count_worker.shutdown, Qt.DirectConnection)
+        self.count_thread.start()
+        startup.since("engine: count thread", begin)
+
+        # set listen thread
+        begin = time.perf_counter()
+        self.listen_thread = QThread()
+        self.listen_worker = ListenWorker(conf.listener_timer_time, self.counter,
+                                          self.journal, self.logger)
+        self.listen_worker.resume_sig.connect(self.auto_resume)
+        self.listen_worker.active_sig.connect(self.count_worker.wake)
+        self.listen_worker.moveToThread(self.listen_thread)
+        self.listen_thread.started.connect(self.listen_worker.run)
+        self.listen_thread.start()
+        startup.since("engine: listen thread", begin)
+
+        # only import QtNetwork when the control socket is used
+        if conf.control_socket:
+            with startup.phase("engine: control socket"):
+                from AutoOBS.control import ControlServer
+                self.control = ControlServer(self, conf.control_socket, self.logger)
+                self.control.listen()
+
+        # only import http.server when the metrics are served
+        if conf.metrics_port:
+            with startup.phase("engine: metrics server"):
+                from AutoOBS.exporter import MetricsServer
+                self.metrics = MetricsServer(self, conf.metrics_port, self.logger)
+                self.metrics.listen()
+
+        self.watcher.addPath(self.conf_path)
+
+        # initial mode: auto
+        self.set_mode("auto")
+
+        # runs on the first pass of the event loop
+        QTimer.singleShot(0, self.on_interactive)
+
+    def on_interactive(self) -> None:
+        self.interactive_time = time.perf_counter() - self.startup_time
+        self.logger.info("Startup: interactive after {:.3f}s, peak RSS {:.1f} MiB."
+                         .format(self.interactive_time, peak_rss()))
+        startup.mark("interactive")
+        self.finish_startup()
+
+    # the profile is complete once the first connect attempt of every OBS is done
+    def finish_startup(self) -> None:
+        if self.interactive_time is not None and None not in self.obs.connected:
+            startup.finish()
+
+    # ObsWorker reconnects by itself, this only keeps track of the connection
+    @pyqtSlot(int)
+    def on_obs_connected(self, ret: int) -> None:
+        if ret == CONNECT_FAILED_RET:
+            if self.obs_connected is not False:
+                self.obs_down_sig.emit(", ".join(self.obs.down))
+            self.obs_connected = False
+        else:
+            self.obs_connected = True
+            if self.connected_time is None:
+                self.connected_time = time.perf_counter() - self.startup_time
+                self.logger.info("Startup: connected to OBS after {:.3f}s."
+                                 .format(self.connected_time))
+                startup.mark("connected")
+        self.finish_startup()
+
+    # the workers' shutdown slots are connected to QThread.finished, which
+    # is emitted in the finishing thread: Qt only lets a thread stop its
+    # own timers. A thread still blocked in an OBS request is left to the
+    # process exit.
+    def stop(self, timeout: int = 1000) -> None:
+        if self.control is not None:
+            self.control.close()
+        if self.metrics is not None:
+            self.metrics.close()
+        for thread in self.threads:
+            thread.quit()
+        for thread in self.threads:
+            thread.wait(timeout)
+        self.listen_worker.end_burst()
+        self.journal.close()
+
+    @pyqtSlot()
+    @tracer.traced("engine")
+    def reload(self) -> None:
+        # a file replaced by rename is no longer watched
+        if self.conf_path not in self.watcher.files() and os.path.isfile(self.conf_path):
+            self.watcher.addPath(self.conf_path)
+
+        try:
+            settings = load_conf(self.conf_path)
+        except ConfError as e:
+            self.logger.error("Reload of {} failed, keep the current settings: {}"
+                              .format(self.conf_path, e))
+            return
+        self.apply(settings)
+
+    # the workers keep their state, idle time, idle flag and run mode, only
+    # their thresholds change
+    def apply(self, settings: Settings) -> None:
+        changed = [field for field in Settings._fields
+                   if getattr(settings, field) != getattr(self.settings, field)]
+        restart = [field for field in changed if field in RESTART_SETTINGS]
+        if restart:
+            self.logger.warning("Changes of {} need a restart of AutoOBS."
+                                .format(", ".join(restart)))
+            settings = settings._replace(**{field: getattr(self.settings, field)
+                                            for field in restart})
+        if settings == self.settings:
+            return
+
+        self.settings = settings
+        self.counter.bound = settings.counter_bound
+        self.listen_worker.set_timer_time(settings.listener_timer_time)
+        # re-arms the count timer in its thread with the new bound
+        self.schedule_sig.emit(settings.stop_schedule)
+        self.logger.info("Settings reloaded: {}.".format(", ".join(
+            "{} = {}".format(field, getattr(settings, field))
+            for field in changed if field not in restart)))
+
+    def set_mode(self, mode: str) -> None:
+        self.run_mode = mode
+        self.count_active_sig.emit(mode == "auto")
+        self.mode_sig.emit(mode)
+
+    # methods for auto mode
+    @pyqtSlot(float)
+    @tracer.traced("engine")
+    def auto_resume(self, origin: float) -> None:
+        if self.run_mode == "auto":
+            self.obs.command("resume_or_start", origin)
+
+    @pyqtSlot()
+    @tracer.traced("engine")
+    def auto_pause(self) -> None:
+        if self.run_mode == "auto":
+            self.obs.command("pause")
+
+    @pyqtSlot()
+    @tracer.traced("engine")
+    def auto_stop(self) -> None:
+        if self.run_mode == "auto":
+            self.obs.command("paused_then_stop")
+
+    # start, stop, resume or pause, only in manual mode
+    def manual(self, cmd: str) -> None:
+        if self.run_mode == "manual":
+            self.obs.command(cmd)
+
+    def stats_text(self) -> str:
+        stats = self.obs.stats()
+        texts = []
+        for worker, (name, snapshot) in zip(self.obs.workers, self.obs.snapshot().items()):
+            connection = snapshot["connection"]
+            commands = snapshot["commands"]
+            texts.append("\n".join([
+                name,
+                stats[name].report(),
+                "",
+                worker.resume_latency.report(),
+                "",
+                "commands sent:       {}".format(sum(commands["sent"].values())),
+                "already satisfied:   {}".format(sum(commands["satisfied"].values())),
+                "already in flight:   {}".format(sum(commands["duplicated"].values())),
+                "expired:             {}".format(sum(commands["expired"].values())),
+                "superseded:          {}".format(sum(commands["superseded"].values())),
+                "reconnects:          {}".format(connection["reconnects"]),
+                "downtime:            {:.1f}s".format(connection["downtime"]),
+            ]))
+        return "\n\n".join(texts)
+
+    def dump_stats(self) -> None:
+        os.makedirs(LOG_PATH, exist_ok=True)
+        stats_filename = os.path.join(LOG_PATH, "stats_{}.json".format(time.strftime("%Y-%m-%d_%H-%M-%S")))
+        with open(stats_filename, "w", encoding="utf-8") as f:
+            json.dump(self.obs.snapshot(), f, indent=2)
+
+        self.logger.info("Statistics dumped to {}:\n{}".format(stats_filename, self.stats_text()))
+        if tracer.enabled:
+            self.logger.info("Trace dumped to {}.".format(tracer.dump()))
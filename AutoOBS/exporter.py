@@ -0,0 +1,197 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional, Tuple
+
+from AutoOBS.const import status_to_str, METRICS_HOST
+from AutoOBS.metrics import OUTCOMES
+
+
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# commands OBS was not asked for, by reason
+SUPPRESSED = (("satisfied", "satisfied"), ("in_flight", "duplicated"),
+              ("expired", "expired"), ("superseded", "superseded"))
+
+# (name suffix, labels, value)
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(labels: Tuple[Tuple[str, str], ...], histogram: dict) -> List[Sample]:
+    """Samples of one Histogram.as_dict(), the buckets made cumulative"""
+    samples = []
+    total = 0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        total += count
+        le = "+Inf" if bound == "+Inf" else _number(float(bound))
+        samples.append(("_bucket", labels + (("le", le),), total))
+    samples.append(("_count", labels, histogram["count"]))
+    samples.append(("_sum", labels, histogram["sum"]))
+    return samples
+
+
+class Exposition:
+    """Metric families in the Prometheus text format, or in OpenMetrics,
+    which names a counter family without its _total and ends with # EOF.
+    """
+
+    def __init__(self, openmetrics: bool = False) -> None:
+        self.openmetrics = openmetrics
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, text: str, samples: Iterable[Sample]) -> None:
+        family = name[:-len("_total")] if self.openmetrics and kind == "counter" else name
+        self.lines.append("# HELP {} {}".format(family, text))
+        self.lines.append("# TYPE {} {}".format(family, kind))
+        for suffix, labels, value in samples:
+            label_text = ",".join("{}=\"{}\"".format(key, _escape(label)) for key, label in labels)
+            self.lines.append("{}{}{} {}".format(name, suffix,
+                                                 "{" + label_text + "}" if labels else "",
+                                                 _number(value)))
+
+    def text(self) -> str:
+        if self.openmetrics:
+            return "\n".join(self.lines + ["# EOF"]) + "\n"
+        return "\n".join(self.lines) + "\n"
+
+
+def render(engine, openmetrics: bool = False) -> str:
+    """The runtime counters of engine, read from the server thread.
+
+    The counters are plain ints and dicts written by their own thread, a
+    copy of a dict is atomic under the GIL, RequestStats takes its lock.
+    """
+    out = Exposition(openmetrics)
+    obs = engine.obs
+
+    inputs = dict(engine.listen_worker.inputs)
+    out.family("autoobs_input_events_total", "counter", "Input events seen by the listeners.",
+               [("", (("type", name),), count) for name, count in inputs.items()])
+    overflows = dict(engine.count_worker.overflows)
+    out.family("autoobs_counter_overflows_total", "counter",
+               "Idle counter overflows that paused or stopped OBS.",
+               [("", (("action", name),), count) for name, count in overflows.items()])
+    out.family("autoobs_idle_seconds", "gauge", "Seconds since the last input event.",
+               [("", (), engine.counter.idle_time)])
+    out.family("autoobs_mode", "gauge", "Run mode, 1 for the current one.",
+               [("", (("mode", mode),), int(mode == engine.run_mode))
+                for mode in ("auto", "manual")])
+    issued = dict(obs.issued)
+    out.family("autoobs_commands_issued_total", "counter", "Commands issued to every OBS.",
+               [("", (("command", cmd),), count) for cmd, count in issued.items()])
+
+    sent, suppressed, requests, latency = [], [], [], []
+    connected, status, reconnects, disconnects, downtime = [], [], [], [], []
+    for name, worker, up in zip(obs.names, obs.workers, obs.connected):
+        target = (("obs", name),)
+        counts = {"satisfied": dict(worker.state.satisfied),
+                  "duplicated": dict(worker.state.duplicated),
+                  "expired": dict(worker.commands.expired),
+                  "superseded": dict(worker.commands.superseded)}
+        sent.extend(("", target + (("request", req),), count)
+                    for req, count in dict(worker.state.sent).items())
+        for reason, key in SUPPRESSED:
+            suppressed.extend(("", target + (("command", cmd), ("reason", reason)), count)
+                              for cmd, count in counts[key].items())
+
+        for request, stats in worker.stats.as_dict().items():
+            labels = target + (("request", request),)
+            requests.extend(("", labels + (("outcome", outcome),), stats[outcome])
+                            for outcome in OUTCOMES)
+            latency.extend(_histogram(labels, stats))
+
+        connected.append(("", target, int(bool(up))))
+        status.extend(("", target + (("status", text),), int(worker.status == value))
+                      for value, text in status_to_str.items())
+        reconnects.append(("", target, worker.reconnects))
+        disconnects.append(("", target, worker.disconnects))
+        downtime.append(("", target, worker.current_downtime))
+
+    out.family("autoobs_obs_commands_sent_total", "counter",
+               "Commands that sent a request to OBS, by request.", sent)
+    out.family("autoobs_obs_commands_suppressed_total", "counter",
+               "Commands dropped without a request, by reason.", suppressed)
+    out.family("autoobs_obs_requests_total", "counter",
+               "obs-websocket requests by outcome.", requests)
+    out.family("autoobs_obs_request_seconds", "histogram",
+               "obs-websocket request latency.", latency)
+    out.family("autoobs_obs_connected", "gauge", "1 while connected to OBS.", connected)
+    out.family("autoobs_obs_status", "gauge", "Recording status of OBS, 1 for the current one.",
+               status)
+    out.family("autoobs_obs_reconnects_total", "counter", "Reconnects after a lost connection.",
+               reconnects)
+    out.family("autoobs_obs_disconnects_total", "counter", "Lost connections to OBS.",
+               disconnects)
+    out.family("autoobs_obs_downtime_seconds_total", "counter",
+               "Seconds without a connection after it was lost.", downtime)
+    return out.text()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        try:
+            body = render(self.server.engine, openmetrics).encode("utf-8")
+        except Exception:
+            self.server.logger.exception("Metrics: render failed.")
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # scrapes every few seconds would flood stderr
+    def log_message(self, format, *args) -> None:
+        self.server.logger.debug("Metrics: " + format % args)
+
+
+class MetricsServer:
+    """Prometheus scrape endpoint on METRICS_HOST:port, /metrics.
+
+    Served by a thread of its own, a scrape only reads the counters, the
+    input callbacks and workers pay nothing but their increments.
+    """
+
+    def __init__(self, engine, port: int, logger: logging.Logger) -> None:
+        self.engine = engine
+        self.port = port
+        self.logger = logger
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def listen(self) -> bool:
+        try:
+            self.server = ThreadingHTTPServer((METRICS_HOST, self.port), MetricsHandler)
+        except OSError as e:
+            self.logger.error("Metrics on {}:{} failed: {}.".format(METRICS_HOST, self.port, e))
+            return False
+
+        self.server.daemon_threads = True
+        self.server.engine = self.engine
+        self.server.logger = self.logger
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        self.logger.info("Metrics served on http://{}:{}/metrics.".format(METRICS_HOST, self.port))
+        return True
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
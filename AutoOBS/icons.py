@@ -0,0 +1,34 @@
+import os
+from functools import lru_cache
+
+from PyQt5.QtCore import QSize, QResource
+from PyQt5.QtGui import QIcon, QPixmap
+
+from AutoOBS.const import status_to_str
+from AutoOBS.resources import RCC_FILE
+
+
+@lru_cache(maxsize=None)
+def register_resources() -> str:
+    """Make the :icons/ resources available, once, and return where from.
+
+    Qt maps the binary resources.rcc, which costs next to nothing. The
+    compiled resources.py module is only imported when the .rcc is missing.
+    """
+    if os.path.isfile(RCC_FILE) and QResource.registerResource(RCC_FILE):
+        return "rcc"
+
+    from AutoOBS.resources import resources  # noqa: F401, registers on import
+    return "module"
+
+
+@lru_cache(maxsize=None)
+def pixmap(status: int, size: int) -> QPixmap:
+    register_resources()
+    return QPixmap(":icons/{}.png".format(status_to_str[status])).scaled(QSize(size, size))
+
+
+@lru_cache(maxsize=None)
+def icon(status: int) -> QIcon:
+    register_resources()
+    return QIcon(":icons/{}.png".format(status_to_str[status]))
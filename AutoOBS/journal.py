@@ -0,0 +1,205 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+import datetime
+import threading
+from typing import Iterator, NamedTuple, Optional
+
+from AutoOBS.const import status_to_str, JOURNAL_FILE, JOURNAL_RECORDS
+
+
+# magic, version, record size, capacity, records written in total
+HEADER = struct.Struct("<4sHHIQ")
+HEADER_SIZE = 32
+COUNT_OFFSET = 12
+COUNT = struct.Struct("<Q")
+MAGIC = b"AOJ1"
+VERSION = 1
+
+# monotonic time, kind, code, target, value, extra
+RECORD = struct.Struct("<dBBHid")
+
+# record kinds, and what code, value and extra hold for them
+START = 0        # a run began, extra is its wall clock time
+ACTIVITY = 1     # an input burst began, written when it ended, value is its
+                 # events, extra its seconds
+OVERFLOW = 2     # the counter overflowed, code 0 pause or 1 stop, extra idle seconds
+COMMAND = 3      # a command sent a request, code is the command, value its seq
+ACK = 4          # OBS replied, code is the request, value the outcome, extra seconds
+TRANSITION = 5   # OBS status changed, code is the new status, value the old one
+CONNECTION = 6   # code 1 connected, 0 disconnected
+
+KINDS = ("start", "activity", "overflow", "command", "ack", "transition", "connection")
+
+# only ever append to these, the index is what the journal stores
+COMMANDS = ("start", "stop", "resume", "pause", "resume_or_start", "paused_then_stop")
+REQUESTS = ("GetRecordingStatus", "StartRecording", "StopRecording", "PauseRecording",
+            "ResumeRecording", "RequestBatch")
+OUTCOMES = ("ok", "failed", "timeout", "error")
+UNKNOWN = 255
+
+
+class Record(NamedTuple):
+    t: float
+    kind: int
+    code: int
+    target: int
+    value: int
+    extra: float
+
+
+class Journal:
+    """Append-only binary journal, a ring of fixed-size records in a mapped file.
+
+    A write is one struct.pack_into into the mapping under a lock, no
+    syscall, so it stays on in production. The oldest records are
+    overwritten once the ring is full. Timestamps are time.monotonic(), the
+    START record of every run maps them to the wall clock. Without a path
+    the ring lives in anonymous memory.
+    """
+
+    def __init__(self, path: Optional[str] = JOURNAL_FILE, capacity: int = JOURNAL_RECORDS) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        size = HEADER_SIZE + capacity * RECORD.size
+
+        self.count = 0
+        if path is None:
+            self.map = mmap.mmap(-1, size)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                header = os.read(fd, HEADER.size)
+                if len(header) == HEADER.size:
+                    magic, version, record_size, capacity_, count = HEADER.unpack(header)
+                    if (magic, version, record_size, capacity_) == (MAGIC, VERSION,
+                                                                   RECORD.size, capacity):
+                        self.count = count
+                os.ftruncate(fd, size)
+                self.map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, capacity, self.count)
+
+        self.write(START, extra=time.time())
+
+    def write(self, kind: int, code: int = 0, target: int = 0, value: int = 0,
+              extra: float = 0.0, t: Optional[float] = None) -> None:
+        if t is None:
+            t = time.monotonic()
+        with self.lock:
+            # a thread still blocked in an OBS request may return after close
+            if self.map.closed:
+                return
+            RECORD.pack_into(self.map, HEADER_SIZE + self.count % self.capacity * RECORD.size,
+                             t, kind, code, target, value, extra)
+            self.count += 1
+            COUNT.pack_into(self.map, COUNT_OFFSET, self.count)
+
+    def activity(self, begin: float, end: float, events: int) -> None:
+        self.write(ACTIVITY, value=events, extra=end - begin, t=begin)
+
+    def overflow(self, stop: bool, idle: float) -> None:
+        self.write(OVERFLOW, code=int(stop), extra=idle)
+
+    def command(self, target: int, cmd: str, seq: int) -> None:
+        self.write(COMMAND, code=_index(COMMANDS, cmd), target=target, value=seq)
+
+    def ack(self, target: int, name: str, outcome: str, seconds: float) -> None:
+        self.write(ACK, code=_index(REQUESTS, name), target=target,
+                   value=_index(OUTCOMES, outcome), extra=seconds)
+
+    def transition(self, target: int, old: int, new: int) -> None:
+        self.write(TRANSITION, code=new, target=target, value=old)
+
+    def connection(self, target: int, up: bool) -> None:
+        self.write(CONNECTION, code=int(up), target=target)
+
+    def close(self) -> None:
+        with self.lock:
+            self.map.flush()
+            self.map.close()
+
+
+def _index(names: tuple, name: str) -> int:
+    try:
+        return names.index(name)
+    except ValueError:
+        return UNKNOWN
+
+
+def read(path: str = JOURNAL_FILE) -> Iterator[Record]:
+    """Yield the records in the ring of path, the oldest first"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, record_size, capacity, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError("{} is not an AutoOBS journal".format(path))
+
+        for i in range(max(count - capacity, 0), count):
+            yield Record(*RECORD.unpack_from(data, HEADER_SIZE + i % capacity * RECORD.size))
+
+
+def _name(names: tuple, code: int) -> str:
+    return names[code] if code < len(names) else "?"
+
+
+def describe(record: Record) -> str:
+    kind, code, value, extra = record.kind, record.code, record.value, record.extra
+    if kind == START:
+        return "start"
+    elif kind == ACTIVITY:
+        return "activity {} events in {:.1f}s".format(value, extra)
+    elif kind == OVERFLOW:
+        return "overflow after {:.1f}s idle, {}".format(extra, "stop" if code else "pause")
+    elif kind == COMMAND:
+        return "command {} #{}".format(_name(COMMANDS, code), value)
+    elif kind == ACK:
+        return "ack {} {} in {:.3f}s".format(_name(REQUESTS, code), _name(OUTCOMES, value), extra)
+    elif kind == TRANSITION:
+        return "transition {} -> {}".format(status_to_str.get(value, "?"), status_to_str.get(code, "?"))
+    elif kind == CONNECTION:
+        return "connected" if code else "disconnected"
+    return "kind {}".format(kind)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.journal",
+                                     description="Print the AutoOBS activity journal.")
+    parser.add_argument("path", nargs="?", default=JOURNAL_FILE)
+    parser.add_argument("--tail", type=int, default=0, help="only the last N records")
+    args = parser.parse_args()
+
+    # the monotonic clock of every run starts anew, so the records are
+    # ordered by time within their run, activity is written after its burst
+    runs = [[]]
+    for record in read(args.path):
+        if record.kind == START:
+            runs.append([])
+        runs[-1].append(record)
+
+    lines = []
+    for run in runs:
+        # the wall clock of a record is its offset from the START of its run
+        origin = run[0].extra - run[0].t if run and run[0].kind == START else None
+        for record in sorted(run, key=lambda record: record.t):
+            lines.append(_line(record, origin))
+
+    for line in lines[-args.tail:] if args.tail else lines:
+        print(line)
+    sys.stdout.flush()
+
+
+def _line(record: Record, origin: Optional[float]) -> str:
+    when = (datetime.datetime.fromtimestamp(origin + record.t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            if origin is not None else "{:.3f}".format(record.t))
+    if record.kind in (COMMAND, ACK, TRANSITION, CONNECTION):
+        return "{} | obs {} | {}".format(when, record.target, describe(record))
+    return "{} | {}".format(when, describe(record))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import gzip
+import time
+import queue
+import shutil
+import logging
+import logging.handlers
+from typing import Tuple
+
+from AutoOBS.const import LOG_PATH, LOG_MAX_BYTES, LOG_BACKUPS
+
+
+def compress_rotated(source: str, dest: str) -> None:
+    """Rotator of the file handler, gzip the full log and remove it"""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(level: str, stdout: bool) -> Tuple[logging.Logger, logging.handlers.QueueListener]:
+    """Route the AutoOBS logger through a queue to a writer thread.
+
+    Callers, like the pynput callbacks, only put a record on the queue. The
+    writer thread does the file I/O, the file is rotated at
+    LOG_MAX_BYTES with LOG_BACKUPS gzipped old files. The listener returned
+    with the logger is stopped at exit to flush the queue.
+    """
+    logger = logging.getLogger("AutoOBS")
+    logger.setLevel(level)
+
+    if stdout:
+        log_handler = logging.StreamHandler(sys.stdout)
+    else:
+        os.makedirs(LOG_PATH, exist_ok=True)
+        log_filename = os.path.join(LOG_PATH, "{}.log".format(time.strftime("%Y-%m-%d_%H-%M-%S")))
+        log_handler = logging.handlers.RotatingFileHandler(log_filename, mode='a', encoding="utf-8",
+                                                           maxBytes=LOG_MAX_BYTES,
+                                                           backupCount=LOG_BACKUPS)
+        log_handler.namer = lambda name: name + ".gz"
+        log_handler.rotator = compress_rotated
+    log_handler.setLevel(level)
+    log_formatter = logging.Formatter("%(asctime)s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    log_handler.setFormatter(log_formatter)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, log_handler, respect_handler_level=True)
+    listener.start()
+    return logger, listener
@@ -0,0 +1,143 @@
+import bisect
+import threading
+from collections import deque
+from typing import Dict, Tuple
+
+from AutoOBS.const import LATENCY_BUCKETS, RESUME_LATENCY_WINDOW
+
+
+OUTCOMES = ("ok", "failed", "timeout", "error")
+
+
+class Histogram:
+    """Fixed-bucket histogram, bucket i counts values <= buckets[i]"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # the last one is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q quantile, interpolated linearly inside its bucket"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def as_dict(self) -> dict:
+        return {"buckets": list(self.buckets) + ["+Inf"],
+                "counts": list(self.counts),
+                "count": self.count,
+                "sum": self.sum,
+                "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99)}
+
+
+class RequestStats:
+    """Latency histogram and outcome counters per obs-websocket request.
+
+    Outcomes are "ok", "failed" (OBS answered with an error), "timeout" and
+    "error" (connection or other exceptions). Requests are observed from
+    the obs thread and the asyncio loop thread, so every access is locked.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, outcome: str = "ok") -> None:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+                self.outcomes[name] = dict.fromkeys(OUTCOMES, 0)
+            self.histograms[name].observe(seconds)
+            self.outcomes[name][outcome] += 1
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {name: dict(self.histograms[name].as_dict(), **self.outcomes[name])
+                    for name in sorted(self.histograms)}
+
+    def report(self) -> str:
+        lines = ["{:<20} {:>7} {:>9} {:>9} {:>9} {:>7} {:>7} {:>7}".format(
+            "request", "count", "p50 ms", "p95 ms", "p99 ms", "failed", "timeout", "error")]
+        for name, stats in self.as_dict().items():
+            lines.append("{:<20} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>7} {:>7} {:>7}".format(
+                name, stats["count"], stats["p50"] * 1000, stats["p95"] * 1000,
+                stats["p99"] * 1000, stats["failed"], stats["timeout"], stats["error"]))
+        return "\n".join(lines)
+
+
+class ResumeLatency:
+    """Stages of the last resumes, from the first input event after an idle
+    pause to the reply of OBS.
+
+    - input: ListenWorker.on_event to Engine.auto_resume, the signal hop to
+      the GUI thread
+    - dispatch: Engine to the ObsWorker slot, the hop to the obs thread and
+      whatever request blocked it
+    - request: the slot until the request is sent
+    - obs: the request until its reply is handled
+
+    Observed in the obs thread, read from the GUI thread, the deque append
+    and copy are atomic.
+    """
+
+    STAGES = ("input", "dispatch", "request", "obs")
+
+    def __init__(self, window: int = RESUME_LATENCY_WINDOW) -> None:
+        self.resumes = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, origin: float, issued: float, received: float,
+                sent: float, replied: float) -> Tuple[float, ...]:
+        """Return the stages and the total of one resume, in s"""
+        stages = (issued - origin, received - issued, sent - received, replied - sent,
+                  replied - origin)
+        self.resumes.append(stages)
+        self.count += 1
+        return stages
+
+    def percentile(self, q: float, stage: int = -1) -> float:
+        values = sorted(stages[stage] for stages in list(self.resumes))
+        if not values:
+            return 0.0
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def as_dict(self) -> dict:
+        result = {"count": self.count, "window": len(self.resumes)}
+        for i, name in enumerate(self.STAGES + ("total",)):
+            result[name] = {"p50": self.percentile(0.5, i),
+                            "p90": self.percentile(0.9, i),
+                            "p99": self.percentile(0.99, i)}
+        return result
+
+    def summary(self) -> str:
+        return "p50 {:.0f} ms, p90 {:.0f} ms over {} resumes".format(
+            self.percentile(0.5) * 1000, self.percentile(0.9) * 1000, len(self.resumes))
+
+    def report(self) -> str:
+        lines = ["{:<20} {:>9} {:>9} {:>9}".format("resume stage", "p50 ms", "p90 ms", "p99 ms")]
+        for i, name in enumerate(self.STAGES + ("total",)):
+            lines.append("{:<20} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+                name, self.percentile(0.5, i) * 1000, self.percentile(0.9, i) * 1000,
+                self.percentile(0.99, i) * 1000))
+        return "\n".join(lines)
@@ -0,0 +1,387 @@
+import time
+import json
+import random
+import asyncio
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import websockets
+
+from AutoOBS.obs_async import auth_string
+from AutoOBS.obs_v5 import (
+    OpCode,
+    EventSubscription,
+    RPC_VERSION,
+    REQUEST_NAMES,
+    RECORD_EVENTS,
+)
+
+
+# v5 request -> v4 request handled by MockObsServer.handle
+V4_NAMES = {v5: v4 for v4, v5 in REQUEST_NAMES.items()}
+# v4 event -> outputState of RecordStateChanged
+OUTPUT_STATES = {v4: v5 for v5, v4 in RECORD_EVENTS.items()}
+
+# v5 close code and request status for a wrong password
+AUTHENTICATION_FAILED = 4009
+
+
+class MockObsServer:
+    """Stand-in for OBS Studio with obs-websocket v4 or v5, recording only.
+
+    The server runs its own asyncio loop in a daemon thread, so benchmarks
+    and tests drive it from any thread. Faults can be injected while it
+    runs:
+
+    - latency, request_latency: reply delay in s, for every request or per
+      request type. Replies to different requests overlap like they would
+      over a slow network.
+    - drop_rate, drop_next(): replies that are never sent, the client runs
+      into its timeout.
+    - disconnect(), disconnect_after: close every client connection.
+    - freeze(), thaw(): stop reading from the clients, pings included, like
+      a half-open connection.
+
+    Every message is recorded in received as (monotonic time, request type,
+    message).
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 0, latency: float = 0.0,
+                 protocol: int = 4, password: Optional[str] = None,
+                 seed: Optional[int] = None) -> None:
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.password = password
+
+        self.latency = latency
+        self.request_latency: Dict[str, float] = {}
+        self.drop_rate = 0.0
+        self.drops = 0
+        # close every connection once this many messages are received
+        self.disconnect_after: Optional[int] = None
+        self.random = random.Random(seed)
+
+        self.recording = False
+        self.paused = False
+        self.received: List[Tuple[float, str, dict]] = []
+
+        self.loop = None
+        self.thread = None
+        self.server = None
+        # connection -> v5 event subscriptions, all events for v4
+        self.clients = {}
+        # v4 connection -> (challenge, salt) or None once authenticated
+        self.challenges = {}
+
+    def start(self) -> int:
+        """Start serving and return the port"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="MockObsServer", daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self.port
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def drop_next(self, count: int = 1) -> None:
+        """Never answer the next count requests"""
+        self.drops += count
+
+    def disconnect(self) -> None:
+        """Close every client connection, the server keeps listening"""
+        asyncio.run_coroutine_threadsafe(self._disconnect(), self.loop).result()
+
+    def freeze(self) -> None:
+        self.loop.call_soon_threadsafe(self._pause_reading, True)
+
+    def thaw(self) -> None:
+        self.loop.call_soon_threadsafe(self._pause_reading, False)
+
+    def requests(self, name: Optional[str] = None) -> List[str]:
+        """Request types received so far, only the ones called name if given"""
+        return [item[1] for item in self.received if name is None or item[1] == name]
+
+    async def _start(self) -> None:
+        self.server = await websockets.serve(self._serve, self.host, self.port)
+        self.port = next(iter(self.server.sockets)).getsockname()[1]
+
+    async def _stop(self) -> None:
+        self.server.close()
+        await self._disconnect()
+        await self.server.wait_closed()
+
+    async def _disconnect(self) -> None:
+        for conn in list(self.clients):
+            await conn.close()
+
+    def _pause_reading(self, pause: bool) -> None:
+        for conn in self.clients:
+            if pause:
+                conn.transport.pause_reading()
+            else:
+                conn.transport.resume_reading()
+
+    async def _serve(self, conn, path: Optional[str] = None) -> None:
+        try:
+            if self.protocol == 5:
+                subscriptions = await self._identify(conn)
+                if subscriptions is None:
+                    return
+                self.clients[conn] = subscriptions
+                reply = self._reply_v5
+            else:
+                self.clients[conn] = ~0
+                reply = self._reply_v4
+
+            async for message in conn:
+                data = json.loads(message)
+                self._record(data)
+                asyncio.ensure_future(reply(conn, data))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.pop(conn, None)
+            self.challenges.pop(conn, None)
+
+    def _record(self, data: dict) -> None:
+        if self.protocol == 5:
+            op = data.get("op")
+            name = data.get("d", {}).get("requestType")
+            if op == OpCode.request_batch:
+                name = "RequestBatch"
+            elif op == OpCode.identify:
+                name = "Identify"
+        else:
+            name = data.get("request-type")
+        self.received.append((time.monotonic(), name, data))
+
+        if self.disconnect_after is not None and len(self.received) >= self.disconnect_after:
+            self.disconnect_after = None
+            asyncio.ensure_future(self._disconnect())
+
+    def _challenge(self) -> Tuple[str, str]:
+        return ("{:032x}".format(self.random.getrandbits(128)),
+                "{:032x}".format(self.random.getrandbits(128)))
+
+    async def _identify(self, conn) -> Optional[int]:
+        hello = {"obsWebSocketVersion": "5.0.1", "rpcVersion": RPC_VERSION}
+        if self.password is not None:
+            challenge, salt = self._challenge()
+            hello["authentication"] = {"challenge": challenge, "salt": salt}
+        await conn.send(json.dumps({"op": OpCode.hello, "d": hello}))
+
+        identify = json.loads(await conn.recv())
+        self._record(identify)
+        if identify.get("op") != OpCode.identify:
+            await conn.close(4007, "Not identified")
+            return None
+        if self.password is not None and identify["d"].get("authentication") != auth_string(
+                self.password, salt, challenge):
+            await conn.close(AUTHENTICATION_FAILED, "Authentication failed")
+            return None
+
+        await conn.send(json.dumps({"op": OpCode.identified,
+                                    "d": {"negotiatedRpcVersion": RPC_VERSION}}))
+        return identify["d"].get("eventSubscriptions", 0)
+
+    async def _delay(self, name: str) -> bool:
+        """Wait for the injected latency, False if the reply is dropped"""
+        delay = self.request_latency.get(name, self.latency)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.drops > 0:
+            self.drops -= 1
+            return False
+        return not (self.drop_rate and self.random.random() < self.drop_rate)
+
+    async def _reply_v4(self, conn, data: dict) -> None:
+        if not await self._delay(data.get("request-type")):
+            return
+
+        reply, events = self.handle(data, conn)
+        await self._send(conn, reply, events)
+
+    async def _reply_v5(self, conn, message: dict) -> None:
+        data = message.get("d", {})
+        if not await self._delay(data.get("requestType", "RequestBatch")):
+            return
+
+        if message.get("op") == OpCode.request:
+            result, events = self._handle_v5(data)
+            reply = {"op": OpCode.request_response, "d": result}
+        elif message.get("op") == OpCode.request_batch:
+            results = []
+            events = []
+            for request in data["requests"]:
+                result, request_events = self._handle_v5(request)
+                results.append(result)
+                events.extend(request_events)
+                if data.get("haltOnFailure") and not result["requestStatus"]["result"]:
+                    break
+            reply = {"op": OpCode.request_batch_response,
+                     "d": {"requestId": data["requestId"], "results": results}}
+        else:
+            return
+
+        await self._send(conn, reply, events)
+
+    def _handle_v5(self, data: dict):
+        name = data["requestType"]
+        reply, events = self.handle({"request-type": V4_NAMES.get(name, name)})
+
+        result = {"requestType": name, "requestId": data.get("requestId")}
+        if reply["status"] == "ok":
+            result["requestStatus"] = {"result": True, "code": 100}
+            if name == "GetRecordStatus":
+                result["responseData"] = {"outputActive": reply["isRecording"],
+                                          "outputPaused": reply["isRecordingPaused"]}
+        else:
+            result["requestStatus"] = {"result": False, "code": reply["code"],
+                                       "comment": reply["error"]}
+
+        return result, [{"op": OpCode.event,
+                         "d": {"eventType": "RecordStateChanged",
+                               "eventIntent": EventSubscription.outputs,
+                               "eventData": {"outputActive": self.recording,
+                                             "outputState": OUTPUT_STATES[event["update-type"]]}}}
+                        for event in events]
+
+    async def _send(self, conn, reply: dict, events: list) -> None:
+        try:
+            await conn.send(json.dumps(reply))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        for event in events:
+            await self.broadcast(event)
+
+    async def broadcast(self, data: dict) -> None:
+        intent = data.get("d", {}).get("eventIntent", 0)
+        for conn, subscriptions in list(self.clients.items()):
+            if intent and not subscriptions & intent:
+                continue
+            try:
+                await conn.send(json.dumps(data))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    def _authenticate(self, data: dict, conn) -> Optional[dict]:
+        """v4 authentication, return the reply to auth requests or None"""
+        name = data.get("request-type")
+        if name == "GetAuthRequired":
+            reply = {"message-id": data.get("message-id"), "status": "ok",
+                     "authRequired": self.password is not None}
+            if self.password is not None and self.challenges.get(conn, ()) is not None:
+                challenge, salt = self._challenge()
+                self.challenges[conn] = (challenge, salt)
+                reply["challenge"] = challenge
+                reply["salt"] = salt
+            return reply
+
+        if name == "Authenticate":
+            challenge = self.challenges.get(conn)
+            if challenge is None:
+                return self._error(data, "Already authenticated", AUTHENTICATION_FAILED)
+            if data.get("auth") != auth_string(self.password, challenge[1], challenge[0]):
+                return self._error(data, "Authentication Failed.", AUTHENTICATION_FAILED)
+            self.challenges[conn] = None
+            return {"message-id": data.get("message-id"), "status": "ok"}
+
+        if self.password is not None and self.challenges.get(conn, ()) is not None:
+            return self._error(data, "Not Authenticated", AUTHENTICATION_FAILED)
+        return None
+
+    def handle(self, data: dict, conn=None):
+        """Return the reply to v4 request data and the events it causes.
+
+        Requests from conn need authentication first when there is a
+        password, without conn they are always accepted.
+        """
+        name = data.get("request-type")
+        reply = {"message-id": data.get("message-id"), "status": "ok"}
+        events = []
+
+        auth_reply = self._authenticate(data, conn) if conn is not None else None
+        if auth_reply is not None:
+            reply = auth_reply
+        elif name == "GetAuthRequired":
+            reply["authRequired"] = False
+        elif name == "GetVersion":
+            reply["obs-websocket-version"] = "4.9.1"
+        elif name == "GetRecordingStatus":
+            reply["isRecording"] = self.recording
+            reply["isRecordingPaused"] = self.paused
+        elif name == "StartRecording":
+            if self.recording:
+                reply = self._error(data, "recording already active", 500)
+            else:
+                self.recording = True
+                events.append("RecordingStarted")
+        elif name == "StopRecording":
+            if not self.recording:
+                reply = self._error(data, "recording not active", 501)
+            else:
+                self.recording = False
+                self.paused = False
+                events.append("RecordingStopped")
+        elif name == "PauseRecording":
+            if not self.recording or self.paused:
+                reply = self._error(data, "recording is not active or already paused",
+                                    502 if self.paused else 501)
+            else:
+                self.paused = True
+                events.append("RecordingPaused")
+        elif name == "ResumeRecording":
+            if not self.recording or not self.paused:
+                reply = self._error(data, "recording is not active or not paused",
+                                    503 if self.recording else 501)
+            else:
+                self.paused = False
+                events.append("RecordingResumed")
+        else:
+            reply = self._error(data, "invalid request type", 204)
+
+        return reply, [{"update-type": event} for event in events]
+
+    # code is the v5 RequestStatus of the error
+    @staticmethod
+    def _error(data: dict, error: str, code: int) -> dict:
+        return {"message-id": data.get("message-id"), "status": "error",
+                "error": error, "code": code}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.mock_obs",
+                                     description="Stand-in OBS Studio for benchmarks and tests.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--protocol", type=int, choices=(4, 5), default=4)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--latency", type=float, default=0.0, help="reply delay in s")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="share of replies that are never sent")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockObsServer(args.host, args.port, args.latency, args.protocol,
+                           args.password, args.seed)
+    server.drop_rate = args.drop_rate
+    port = server.start()
+    print("Mock obs-websocket v{} on {}:{}".format(args.protocol, args.host, port))
+
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    print("{} messages received".format(len(server.received)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import json
+import base64
+import asyncio
+import hashlib
+import threading
+import itertools
+import concurrent.futures
+from typing import Dict, Optional
+
+import websockets
+from obswebsocket import base_classes, exceptions
+from obswebsocket.core import EventManager, RecvThread
+
+from AutoOBS.const import OBS_CALL_TIMEOUT
+
+
+def auth_string(password: str, salt: str, challenge: str) -> str:
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode("utf-8")).digest())
+    return base64.b64encode(
+        hashlib.sha256(secret + challenge.encode("utf-8")).digest()).decode("utf-8")
+
+
+class AsyncObsws:
+    """obs-websocket v4 client on an asyncio loop in a daemon thread.
+
+    It has the interface of obswebsocket.obsws, so ObsWorker can use it in
+    place of obsws. Requests are pipelined on one connection, replies are
+    matched by message-id, and every request has its own deadline.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 4444,
+                 password: str = "", timeout: float = OBS_CALL_TIMEOUT) -> None:
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+
+        self.eventmanager = EventManager()
+
+        self.loop = None
+        self.thread = None
+        self.conn = None
+        self.reader = None
+        self.ids = itertools.count(1)
+        self.answers: Dict[str, asyncio.Future] = {}
+
+        # called from the loop thread when the connection drops by itself
+        self.on_disconnect = None
+        self.closing = False
+
+    def _run_loop(self) -> None:
+        if self.loop is not None:
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="AsyncObsws", daemon=True)
+        self.thread.start()
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def connect(self, host: Optional[str] = None, port: Optional[int] = None) -> None:
+        if host is not None:
+            self.host = host
+        if port is not None:
+            self.port = port
+
+        self._run_loop()
+        try:
+            self._run(self._connect(), self.timeout)
+        except (OSError, asyncio.TimeoutError, concurrent.futures.TimeoutError,
+                websockets.exceptions.WebSocketException) as e:
+            raise exceptions.ConnectionFailure(str(e))
+
+    def reconnect(self) -> None:
+        try:
+            self.disconnect()
+        except Exception:
+            pass
+        self.connect()
+
+    def disconnect(self) -> None:
+        if self.loop is not None and self.conn is not None:
+            self._run(self._disconnect(), self.timeout)
+
+    async def _connect(self) -> None:
+        self.closing = False
+        self.conn = await websockets.connect("ws://{}:{}".format(self.host, self.port),
+                                             ping_interval=None, max_size=None)
+        self.reader = asyncio.ensure_future(self._recv())
+        await self._auth()
+
+    async def _disconnect(self) -> None:
+        self.closing = True
+        await self.conn.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+            self.reader = None
+
+    async def _auth(self) -> None:
+        result = await self.request({"request-type": "GetAuthRequired"})
+        if result["status"] != "ok":
+            raise exceptions.ConnectionFailure(result["error"])
+
+        if result.get("authRequired"):
+            auth = auth_string(self.password, result["salt"], result["challenge"])
+            result = await self.request({"request-type": "Authenticate", "auth": auth})
+            if result["status"] != "ok":
+                raise exceptions.ConnectionFailure(result["error"])
+
+    async def _recv(self) -> None:
+        try:
+            async for message in self.conn:
+                self._dispatch(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for answer in self.answers.values():
+                if not answer.done():
+                    answer.set_exception(exceptions.ConnectionFailure("Connection closed"))
+            self.answers.clear()
+
+            if not self.closing and self.on_disconnect is not None:
+                self.on_disconnect()
+
+    def _dispatch(self, result: dict) -> None:
+        if "update-type" in result:
+            try:
+                self.eventmanager.trigger(RecvThread.build_event(result))
+            except exceptions.ObjectError:
+                pass
+        elif "message-id" in result:
+            self._answer(result["message-id"], result)
+
+    def _answer(self, message_id: str, result) -> None:
+        answer = self.answers.pop(message_id, None)
+        if answer is not None and not answer.done():
+            answer.set_result(result)
+
+    async def request(self, data: dict, timeout: Optional[float] = None) -> dict:
+        message_id = str(next(self.ids))
+        data["message-id"] = message_id
+        return await self._exchange(message_id, data, timeout)
+
+    async def _exchange(self, message_id: str, payload: dict, timeout: Optional[float]):
+        answer = self.loop.create_future()
+        self.answers[message_id] = answer
+        try:
+            await self.conn.send(json.dumps(payload))
+            return await asyncio.wait_for(answer, self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.MessageTimeout("No answer for message {}".format(message_id))
+        except websockets.exceptions.ConnectionClosed as e:
+            raise exceptions.ConnectionFailure(str(e))
+        finally:
+            self.answers.pop(message_id, None)
+
+    async def _call(self, obj: base_classes.Baserequests,
+                    timeout: Optional[float]) -> base_classes.Baserequests:
+        obj.input(await self.request(obj.data(), timeout))
+        return obj
+
+    def call_async(self, obj: base_classes.Baserequests,
+                   timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Send obj without waiting, the future is done when its reply is in"""
+        if not isinstance(obj, base_classes.Baserequests):
+            raise exceptions.ObjectError("Call parameter is not a request object")
+        return asyncio.run_coroutine_threadsafe(self._call(obj, timeout), self.loop)
+
+    def call(self, obj: base_classes.Baserequests,
+             timeout: Optional[float] = None) -> base_classes.Baserequests:
+        return self.call_async(obj, timeout).result()
+
+    def send(self, data: dict, timeout: Optional[float] = None) -> dict:
+        return self._run(self.request(data, timeout))
+
+    async def _ping(self, timeout: float) -> None:
+        pong = await self.conn.ping()
+        await asyncio.wait_for(pong, timeout)
+
+    def ping(self, timeout: float) -> bool:
+        """Websocket ping, False when no pong comes back within timeout"""
+        try:
+            self._run(self._ping(timeout), timeout + 1)
+            return True
+        except Exception:
+            return False
+
+    def register(self, func, event=None) -> None:
+        self.eventmanager.register(func, event)
+
+    def unregister(self, func, event=None) -> None:
+        self.eventmanager.unregister(func, event)
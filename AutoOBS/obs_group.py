@@ -0,0 +1,152 @@
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from PyQt5.QtCore import (
+    pyqtSignal,
+    pyqtSlot,
+    Qt,
+    QObject,
+    QThread,
+)
+
+from AutoOBS.const import (
+    OBStatus,
+    status_to_str,
+    CONNECT_FAILED_RET,
+    CONNECT_SUCCESS_RET,
+)
+from AutoOBS.conf import Target
+from AutoOBS.state import Command
+from AutoOBS.obs_thread import ObsWorker
+from AutoOBS.metrics import RequestStats
+from AutoOBS.journal import Journal
+
+
+COMMANDS = ("start", "stop", "resume", "pause", "resume_or_start", "paused_then_stop")
+
+
+class TargetLogger(logging.LoggerAdapter):
+    """Prefix the messages of one OBS target with its name"""
+
+    def process(self, msg, kwargs):
+        return "[{}] {}".format(self.extra["name"], msg), kwargs
+
+
+class ObsGroup(QObject):
+    """Every configured OBS, each with its own ObsWorker in its own thread.
+
+    Commands fan out to all workers through queued signals, so every OBS
+    runs them in its own thread and a slow or dead one does not hold up the
+    others. Status and connection are aggregated for the UI.
+    """
+
+    connect_wait_done_sig = pyqtSignal(int)
+    ui_update_sig = pyqtSignal(int)
+
+    connect_sig = pyqtSignal()
+    start_sig = pyqtSignal(object)
+    stop_sig = pyqtSignal(object)
+    resume_sig = pyqtSignal(object)
+    pause_sig = pyqtSignal(object)
+    resume_or_start_sig = pyqtSignal(object)
+    paused_then_stop_sig = pyqtSignal(object)
+
+    def __init__(self, targets: Sequence[Target], reconcile_intvl: int, journal: Journal,
+                 logger: logging.Logger) -> None:
+        super().__init__()
+
+        self.logger = logger
+
+        self.names: List[str] = []
+        self.workers: List[ObsWorker] = []
+        self.threads: List[QThread] = []
+        # None until the first connect attempt of the target is done
+        self.connected: List[Optional[bool]] = []
+        # commands issued to the workers, only counted in the GUI thread
+        self.issued: Dict[str, int] = dict.fromkeys(COMMANDS, 0)
+
+        for target in targets:
+            name = target.name
+            worker = ObsWorker(journal, TargetLogger(logger, {"name": name}) if len(targets) > 1
+                               else logger, len(self.workers))
+            worker.set_backend(target.backend)
+            worker.set_connect(target.host, target.port, target.pw)
+            worker.set_reconcile_interval(reconcile_intvl)
+            worker.set_deadlines(target.timeouts, target.command_deadline)
+
+            worker.connect_wait_done_sig.connect(self.on_connected)
+            worker.ui_update_sig.connect(self.on_status)
+            self.connect_sig.connect(worker.ws_connect)
+            for cmd in COMMANDS:
+                getattr(self, cmd + "_sig").connect(getattr(worker, cmd))
+
+            thread = QThread()
+            worker.moveToThread(thread)
+            thread.finished.connect(worker.shutdown, Qt.DirectConnection)
+
+            self.names.append(name)
+            self.workers.append(worker)
+            self.threads.append(thread)
+            self.connected.append(None)
+
+    def start_threads(self) -> None:
+        for thread in self.threads:
+            thread.start()
+        self.connect_sig.emit()
+
+    # the same command is posted to every worker, each drops it on its own
+    # when it is stale there, by its own command_deadline
+    def issue(self, cmd: str, origin: float = 0.0) -> Command:
+        command = self.workers[0].commands.make(cmd, origin)
+        for worker in self.workers:
+            worker.commands.post(command)
+        return command
+
+    # origin is the time of the input event that led to cmd
+    def command(self, cmd: str, origin: float = 0.0) -> None:
+        self.issued[cmd] += 1
+        getattr(self, cmd + "_sig").emit(self.issue(cmd, origin))
+
+    @property
+    def all_connected(self) -> bool:
+        return all(self.connected)
+
+    @property
+    def down(self) -> List[str]:
+        return [name for name, connected in zip(self.names, self.connected) if not connected]
+
+    # what is recording anywhere is shown as recording, then paused
+    @property
+    def status(self) -> OBStatus:
+        statuses = [worker.status for worker, connected in zip(self.workers, self.connected)
+                    if connected] or [worker.status for worker in self.workers]
+        for status in (OBStatus.recording, OBStatus.paused):
+            if status in statuses:
+                return status
+        return OBStatus.stopped
+
+    def summary(self) -> str:
+        lines = []
+        for name, worker, connected in zip(self.names, self.workers, self.connected):
+            line = "{}: {}".format(name, status_to_str[worker.status] if connected
+                                   else "connecting")
+            if worker.resume_latency.resumes:
+                line += ", resume {}".format(worker.resume_latency.summary())
+            lines.append(line)
+        return "\n".join(lines)
+
+    @pyqtSlot(int)
+    def on_connected(self, ret: int) -> None:
+        self.connected[self.workers.index(self.sender())] = ret == CONNECT_SUCCESS_RET
+        self.connect_wait_done_sig.emit(CONNECT_SUCCESS_RET if self.all_connected
+                                        else CONNECT_FAILED_RET)
+
+    @pyqtSlot(int)
+    def on_status(self, status: int) -> None:
+        self.ui_update_sig.emit(self.status)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: worker.snapshot() for name, worker in zip(self.names, self.workers)}
+
+    def stats(self) -> Dict[str, RequestStats]:
+        return {name: worker.stats for name, worker in zip(self.names, self.workers)}
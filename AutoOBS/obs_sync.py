@@ -0,0 +1,91 @@
+import json
+import socket
+import threading
+from typing import Optional
+
+import websocket
+from obswebsocket import obsws, base_classes, exceptions
+
+from AutoOBS.const import OBS_CALL_TIMEOUT
+
+
+class Answers(dict):
+    """Replies by message-id, waiting for one blocks until it is stored.
+
+    The receiving thread of obsws stores every reply here, so waiters are
+    woken up by the reply instead of polling for it.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cond = threading.Condition()
+        # message-ids nobody waits for any more, their late replies are dropped
+        self.abandoned = set()
+
+    def __setitem__(self, message_id: str, result: dict) -> None:
+        with self.cond:
+            if message_id in self.abandoned:
+                self.abandoned.discard(message_id)
+                return
+            super().__setitem__(message_id, result)
+            self.cond.notify_all()
+
+    def wait(self, message_id: str, timeout: float) -> Optional[dict]:
+        with self.cond:
+            if self.cond.wait_for(lambda: message_id in self, timeout):
+                return self.pop(message_id)
+            self.abandoned.add(message_id)
+            return None
+
+
+class Obsws(obsws):
+    """obswebsocket.obsws with deadlines, keepalive and no own reconnecting.
+
+    The receiving thread of obsws reconnects by itself when the socket
+    closes, here it calls on_disconnect instead and leaves reconnecting to
+    ObsWorker.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 4444,
+                 password: str = "", timeout: float = OBS_CALL_TIMEOUT) -> None:
+        super().__init__(host, port, password)
+
+        self.timeout = timeout
+        self.on_disconnect = None
+        self.answers = Answers()
+
+    def reconnect(self) -> None:
+        if self.thread_recv is not None:
+            self.thread_recv.running = False
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+
+    def call(self, obj: base_classes.Baserequests,
+             timeout: Optional[float] = None) -> base_classes.Baserequests:
+        if not isinstance(obj, base_classes.Baserequests):
+            raise exceptions.ObjectError("Call parameter is not a request object")
+        obj.input(self.send(obj.data(), timeout))
+        return obj
+
+    def send(self, data: dict, timeout: Optional[float] = None) -> dict:
+        message_id = str(self.id)
+        self.id += 1
+        data["message-id"] = message_id
+        self.ws.send(json.dumps(data))
+        return self._wait_message(message_id, self.timeout if timeout is None else timeout)
+
+    def _wait_message(self, message_id: str, timeout: float = OBS_CALL_TIMEOUT) -> dict:
+        result = self.answers.wait(message_id, timeout)
+        if result is None:
+            raise exceptions.MessageTimeout("No answer for message {}".format(message_id))
+        return result
+
+    def ping(self, timeout: float) -> bool:
+        # websocket-client answers pongs internally, so a request is the only
+        # way to know the other end is still there
+        try:
+            self.ws.ping()
+            self.send({"request-type": "GetVersion"}, timeout)
+            return True
+        except (exceptions.MessageTimeout, websocket.WebSocketException, socket.error):
+            return False
@@ -1,39 +1,147 @@
 import sys
+import time
+import random
 import logging
+from typing import Dict, List, Optional
+from collections import deque
+from concurrent.futures import Future
 
 from PyQt5.QtCore import (
     pyqtSignal,
     pyqtSlot,
     QObject,
+    QTimer,
 )
-from obswebsocket import obsws, requests
+from obswebsocket import requests, events
 import obswebsocket.exceptions
 
 from AutoOBS.const import (
     OBStatus,
+    status_to_str,
     CONNECT_FAILED_RET,
     CONNECT_SUCCESS_RET,
+    OBS_RECONCILE_INTVL,
+    OBS_BACKEND,
+    OBS_REQUEST_TIMEOUTS,
+    OBS_QUEUE_LEN,
+    OBS_QUEUE_EXPIRY,
+    OBS_PING_INTVL,
+    OBS_PING_TIMEOUT,
+    OBS_BACKOFF_BASE,
+    OBS_BACKOFF_MAX,
 )
+from AutoOBS.state import RecordStateMachine, Command, CommandBoard
+from AutoOBS.obs_sync import Obsws
+from AutoOBS.metrics import RequestStats, ResumeLatency
+from AutoOBS.profiling import startup
+from AutoOBS.journal import Journal
+from AutoOBS.tracing import tracer
+
+
+# requests of a command batched together with the v5 backend
+BATCHES = {
+    "resume_or_start": ("ResumeRecording", "StartRecording"),
+}
 
 
 class ObsWorker(QObject):
 
     connect_wait_done_sig = pyqtSignal(int)
     ui_update_sig = pyqtSignal(int)
+    call_done_sig = pyqtSignal(object, object)
+    disconnected_sig = pyqtSignal()
 
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(self, journal: Journal, logger: logging.Logger, target: int = 0) -> None:
         super().__init__()
 
         self.logger = logger
+        # index of this OBS in the journal
+        self.journal = journal
+        self.target = target
 
         self.host = None
         self.port = None
         self.pw = None
-        self.ws = obsws(self.host, self.port, self.pw)
+        self.backend = OBS_BACKEND
+        self.ws = Obsws(self.host, self.port, self.pw)
+        self._register_events()
+
+        self.connected = False
+        # (command, expiry) issued while not connected, replayed after it
+        self.queued = deque(maxlen=OBS_QUEUE_LEN)
 
+        # connection metrics
+        self.disconnects = 0
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.down_since = None
+        self.attempts = 0
+
+        self.state = RecordStateMachine()
+        self.commands = CommandBoard()
+        self.timeouts = dict(OBS_REQUEST_TIMEOUTS)
+        self.stats = RequestStats()
+        self.resume_latency = ResumeLatency()
+        # (request, origin, issued, received, sent) of the resume in flight
+        self.resume_trace = None
         self.recording_flag = False
         self.paused_flag = False
-        self.status = "stopped"
+        self.status = OBStatus.stopped
+
+        self.reconcile_timer = QTimer(self)
+        self.reconcile_timer.setInterval(OBS_RECONCILE_INTVL * 1000)
+        self.reconcile_timer.timeout.connect(self.reconcile)
+
+        self.keepalive_timer = QTimer(self)
+        self.keepalive_timer.setInterval(OBS_PING_INTVL * 1000)
+        self.keepalive_timer.timeout.connect(self.keepalive)
+
+        # perf_counter() when the reconnect was scheduled, the backoff in a trace
+        self.backoff_begin = 0.0
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.try_reconnect)
+        self.disconnected_sig.connect(self.on_disconnected)
+
+        # replies of pipelined requests are handled back in this thread
+        self.call_done_sig.connect(self._call_done)
+
+    # status is pushed by obs-websocket events, polling is only a periodic
+    # safety net
+    def _register_events(self) -> None:
+        for event, status in ((events.RecordingStarted, OBStatus.recording),
+                              (events.RecordingResumed, OBStatus.recording),
+                              (events.RecordingPaused, OBStatus.paused),
+                              (events.RecordingStopped, OBStatus.stopped)):
+            self.ws.register(lambda _, status=status: self.on_status_event(status),
+                             event)
+        self.ws.on_disconnect = self.disconnected_sig.emit
+
+    # "obsws" waits for each reply, "asyncio" keeps requests in flight and
+    # "v5" also sends check-then-act commands as one RequestBatch
+    def set_backend(self, backend: str) -> None:
+        if backend == self.backend:
+            return
+
+        # only import asyncio and websockets when they are used
+        if backend == "asyncio":
+            from AutoOBS.obs_async import AsyncObsws
+            self.ws = AsyncObsws(self.host, self.port, self.pw)
+        elif backend == "v5":
+            from AutoOBS.obs_v5 import AsyncObsws5
+            self.ws = AsyncObsws5(self.host, self.port, self.pw)
+        else:
+            self.ws = Obsws(self.host, self.port, self.pw)
+        self.backend = backend
+        self._register_events()
+
+    @property
+    def pipelined(self) -> bool:
+        return self.backend in ("asyncio", "v5")
+
+    @property
+    def batched(self) -> bool:
+        return self.backend == "v5"
 
     def set_connect(self, host: str, port: int, pw: str) -> None:
         self.host = host
@@ -43,114 +151,421 @@ class ObsWorker(QObject):
         self.ws.port = port
         self.ws.password = pw
 
+    def set_reconcile_interval(self, intvl: int) -> None:
+        self.reconcile_timer.setInterval(intvl * 1000)
+
+    def set_deadlines(self, timeouts: Dict[str, float], command_deadline: float) -> None:
+        self.timeouts.update(timeouts)
+        self.commands.deadline = command_deadline
+
+    def _timeout(self, name: str) -> float:
+        return self.timeouts.get(name, self.ws.timeout)
+
+    @property
+    def current_downtime(self) -> float:
+        if self.down_since is None:
+            return self.downtime
+        return self.downtime + time.monotonic() - self.down_since
+
     @pyqtSlot()
     def ws_connect(self) -> None:
+        tracer.name_thread("obs {}:{}".format(self.host, self.port))
+        if not self._connect():
+            self._schedule_reconnect()
+
+    def _connect(self) -> bool:
         try:
-            self.ws.connect()
-            self._update_status()
-            self.connect_wait_done_sig.emit(CONNECT_SUCCESS_RET)
+            with startup.phase("obs: connect {}:{}".format(self.host, self.port)):
+                self.ws.connect()
+                self._update_status()
+            # requests in flight when the connection dropped got no answer
+            self.state.resync(self.status)
         except obswebsocket.exceptions.ConnectionFailure:
-            self.logger.exception("ws_connect: Connection Failed.")
+            if self.attempts == 0:
+                self.logger.exception("ws_connect: Connection Failed.")
+            else:
+                self.logger.error("ws_connect: Connection Failed, attempt {}.".format(self.attempts))
             self.connect_wait_done_sig.emit(CONNECT_FAILED_RET)
+            return False
         except:
             self.logger.exception("ws_connect: Unexpected error: {}.".format(sys.exc_info()[0]))
             self.connect_wait_done_sig.emit(CONNECT_FAILED_RET)
+            return False
+
+        self.connected = True
+        self.attempts = 0
+        self.journal.connection(self.target, True)
+        if self.down_since is not None:
+            self.reconnects += 1
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+            self.logger.info("Reconnected to OBS, {} reconnects, {:.1f}s down in total."
+                             .format(self.reconnects, self.downtime))
+
+        self.reconcile_timer.start()
+        self.keepalive_timer.start()
+        self.connect_wait_done_sig.emit(CONNECT_SUCCESS_RET)
+        self.ui_update_sig.emit(self.status)
+        self._replay()
+        return True
+
+    # exponential backoff with jitter, so several AutoOBS do not hammer an
+    # OBS that is starting up
+    def _schedule_reconnect(self) -> None:
+        delay = min(OBS_BACKOFF_BASE * 2 ** self.attempts, OBS_BACKOFF_MAX)
+        delay = random.uniform(delay / 2, delay)
+        self.attempts += 1
+
+        self.logger.info("Reconnect to OBS in {:.1f}s.".format(delay))
+        self.backoff_begin = time.perf_counter()
+        self.reconnect_timer.start(int(delay * 1000))
 
-    def _ws_call(self, req: requests.Baserequests) -> None:
+    @pyqtSlot()
+    @tracer.traced("obs")
+    def try_reconnect(self) -> None:
+        tracer.complete("ObsWorker.backoff", "sleep", self.backoff_begin, time.perf_counter(),
+                        {"attempt": self.attempts})
         try:
-            self.ws.call(req)
+            self.ws.disconnect()
+        except:
+            pass
+
+        if not self._connect():
+            self._schedule_reconnect()
+
+    # the obs thread is finishing, no reconnect or keepalive may follow
+    @pyqtSlot()
+    def shutdown(self) -> None:
+        self.reconcile_timer.stop()
+        self.keepalive_timer.stop()
+        self.reconnect_timer.stop()
+
+    @pyqtSlot()
+    @tracer.traced("obs")
+    def on_disconnected(self) -> None:
+        if not self.connected:
+            return
+
+        self.connected = False
+        self.disconnects += 1
+        self.journal.connection(self.target, False)
+        self.down_since = time.monotonic()
+        self.reconcile_timer.stop()
+        self.keepalive_timer.stop()
+
+        self.logger.error("Lost the connection to OBS.")
+        self.connect_wait_done_sig.emit(CONNECT_FAILED_RET)
+        self._schedule_reconnect()
+
+    # catches half-open connections, where no close ever arrives
+    @pyqtSlot()
+    @tracer.traced("obs")
+    def keepalive(self) -> None:
+        begin = time.perf_counter()
+        ok = self.ws.ping(OBS_PING_TIMEOUT)
+        self.stats.observe("Ping", time.perf_counter() - begin, "ok" if ok else "timeout")
+        if not ok:
+            self.logger.error("OBS did not answer the keepalive ping in {}s."
+                              .format(OBS_PING_TIMEOUT))
+            self.on_disconnected()
+
+    # future is the pending reply of a pipelined request, None to call and
+    # wait here
+    def _ws_call(self, req: requests.Baserequests,
+                 future: Optional[Future] = None) -> bool:
+        try:
+            if future is None:
+                self._timed_call(req)
+            else:
+                future.result()
+            if not req.status:
+                self.logger.error("ws_call Request {} failed: {}."
+                                  .format(req.name, req.datain.get("error")))
+            return req.status
         except obswebsocket.exceptions.MessageTimeout as e:
-            # self.logger.exception("Time:                {}.".format(time.strftime("%Y-%m-%d %H:%M:%S")))
-            self.logger.exception("obs_ws exception:      {}.".format(e.args[0]))
-            self.logger.exception("ws_call Request:       {}.".format(req.name))
-            self.logger.exception("Before call Recording? {}.".format(self.recording_flag))
-            self.logger.exception("Before call Paused?    {}.".format(self.paused_flag))
-            print("obs_ws exception:      {}.".format(e.args[0]))
-            print("ws_call Request:       {}.".format(req.name))
-            print("Before call Recording? {}.".format(self.recording_flag))
-            print("Before call Paused?    {}.".format(self.paused_flag))
-            self._update_status()
-            self.logger.exception("After call Recording?  {}.".format(self.recording_flag))
-            self.logger.exception("After call Paused?     {}.".format(self.paused_flag))
-            print("After call Recording?  {}.".format(self.recording_flag))
-            print("After call Paused?     {}.".format(self.paused_flag))
+            before = (self.recording_flag, self.paused_flag)
+            try:
+                self._update_status()
+            except:
+                self.logger.exception("ws_call: status update after timeout failed: {}."
+                                      .format(sys.exc_info()[0]))
+            self.logger.error("ws_call Request {} timed out: {}. Recording? {} -> {}, "
+                              "Paused? {} -> {}.".format(req.name, e.args[0], before[0],
+                                                         self.recording_flag, before[1],
+                                                         self.paused_flag))
         except:
             self.logger.exception("ws.call: Unexpected error: {}.".format(sys.exc_info()[0]))
+        return False
 
-    def _update_status(self) -> None:
-        status_flag = self.ws.call(requests.GetRecordingStatus())
-        self.recording_flag = status_flag.getIsRecording()
-        self.paused_flag = status_flag.getIsRecordingPaused()
-
-        if self.paused_flag:
-            self.status = OBStatus.paused
-        elif self.recording_flag:
-            self.status = OBStatus.recording
+    def _timed_call(self, req: requests.Baserequests) -> requests.Baserequests:
+        begin = time.perf_counter()
+        try:
+            self.ws.call(req, self._timeout(req.name))
+        except BaseException as e:
+            self._observe(req.name, begin, self._outcome(e))
+            raise
+        self._observe(req.name, begin, self._outcome(None, req))
+        return req
+
+    # observe a pipelined request when its future is done
+    def _track(self, name: str, future: Future) -> None:
+        begin = time.perf_counter()
+
+        def done(f: Future) -> None:
+            e = f.exception()
+            result = f.result() if e is None else None
+            self._observe(name, begin,
+                          self._outcome(e, result if not isinstance(result, list) else None))
+
+        future.add_done_callback(done)
+
+    # begin is the perf_counter() of the request, the span of the websocket
+    # call in a trace ends here
+    def _observe(self, name: str, begin: float, outcome: str) -> None:
+        end = time.perf_counter()
+        seconds = end - begin
+        tracer.async_span("ws {}".format(name), "websocket", begin, end, {"outcome": outcome})
+        self.stats.observe(name, seconds, outcome)
+        self.journal.ack(self.target, name, outcome, seconds)
+
+    @staticmethod
+    def _outcome(e: Optional[BaseException],
+                 req: Optional[requests.Baserequests] = None) -> str:
+        if isinstance(e, obswebsocket.exceptions.MessageTimeout):
+            return "timeout"
+        elif e is not None:
+            return "error"
+        elif req is not None and not req.status:
+            return "failed"
+        return "ok"
+
+    def snapshot(self) -> dict:
+        return {"requests": self.stats.as_dict(),
+                "resume": self.resume_latency.as_dict(),
+                "commands": {"sent": dict(self.state.sent),
+                             "satisfied": dict(self.state.satisfied),
+                             "duplicated": dict(self.state.duplicated),
+                             "expired": dict(self.commands.expired),
+                             "superseded": dict(self.commands.superseded)},
+                "connection": {"connected": self.connected,
+                               "disconnects": self.disconnects,
+                               "reconnects": self.reconnects,
+                               "downtime": self.current_downtime}}
+
+    def _set_status(self, status: OBStatus) -> None:
+        self.state.set_status(status)
+        self._set_flags(status)
+
+    def _set_flags(self, status: OBStatus) -> None:
+        if status != self.status:
+            self.journal.transition(self.target, self.status, status)
+        self.status = status
+        self.recording_flag = status != OBStatus.stopped
+        self.paused_flag = status == OBStatus.paused
+
+    @staticmethod
+    def _recording_status(status_flag: requests.GetRecordingStatus) -> OBStatus:
+        if status_flag.getIsRecordingPaused():
+            return OBStatus.paused
+        elif status_flag.getIsRecording():
+            return OBStatus.recording
         else:
-            self.status = OBStatus.stopped
+            return OBStatus.stopped
 
-    @pyqtSlot()
-    def start(self) -> None:
-        self._update_status()
-        if self.status == OBStatus.stopped:
-            self.logger.debug("Request starting.")
-            self._ws_call(requests.StartRecording())
+    def _update_status(self) -> None:
+        self._set_status(self._recording_status(self._timed_call(requests.GetRecordingStatus())))
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.recording)
+    # called from the obsws receiving thread
+    @tracer.traced("obs")
+    def on_status_event(self, status: OBStatus) -> None:
+        self.logger.debug("OBS is {} now.".format(status_to_str[status]))
+        self.state.observe(status)
+        self._set_flags(status)
+        self.ui_update_sig.emit(status)
 
     @pyqtSlot()
-    def stop(self) -> None:
-        self._update_status()
-        if self.status != OBStatus.stopped:
-            self.logger.debug("Request directly stopping.")
-            self._ws_call(requests.StopRecording())
+    @tracer.traced("obs")
+    def reconcile(self) -> None:
+        if not self.connected:
+            return
 
+        last = self.status
+        try:
             self._update_status()
-            self.ui_update_sig.emit(OBStatus.stopped)
+        except:
+            self.logger.exception("reconcile: Unexpected error: {}.".format(sys.exc_info()[0]))
+            return
 
-    @pyqtSlot()
-    def resume(self) -> None:
-        self._update_status()
-        if self.status == OBStatus.paused:
-            self.logger.debug("Request resuming.")
-            self._ws_call(requests.ResumeRecording())
+        if self.status != last:
+            self.logger.debug("Reconciled OBS status from {} to {}."
+                              .format(status_to_str[last], status_to_str[self.status]))
+            self.ui_update_sig.emit(self.status)
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.recording)
+    def _replay(self) -> None:
+        now = time.monotonic()
+        while self.queued:
+            cmd, expiry = self.queued.popleft()
+            if now > expiry:
+                self.logger.debug("Drop queued {}, it expired.".format(cmd))
+                continue
 
-    @pyqtSlot()
-    def pause(self) -> None:
-        self._update_status()
-        if self.status == OBStatus.recording:
-            self.logger.debug("Request pausing.")
-            self._ws_call(requests.PauseRecording())
+            self.logger.debug("Replay queued {}.".format(cmd))
+            getattr(self, cmd)()
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.paused)
+    # called from other threads, the returned command is what their signal
+    # passes to the command slot
+    def issue(self, cmd: str) -> Command:
+        return self.commands.issue(cmd)
 
-    @pyqtSlot()
-    def resume_or_start(self) -> None:
-        self._update_status()
-        if self.status == OBStatus.paused:
-            self.logger.debug("Request resuming in resume_or_start, status is paused.")
-            self._ws_call(requests.ResumeRecording())
+    # check cmd against its deadline, newer commands and the state machine,
+    # the returned request is None when the command is stale, OBS is already
+    # there or a request in flight will bring it there
+    def _begin(self, cmd: str, command: Optional[Command] = None) -> Optional[str]:
+        if command is not None:
+            stale = self.commands.claim(command)
+            if stale is not None:
+                self.logger.debug("Drop {}, it is {}.".format(cmd, stale))
+                return None
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.recording)
-        elif self.status == OBStatus.stopped:
+        if not self.connected:
+            # a repeat of the last command only extends its expiry
+            if self.queued and self.queued[-1][0] == cmd:
+                self.queued.pop()
+            else:
+                self.logger.debug("Queue {}, OBS is not connected.".format(cmd))
+            self.queued.append((cmd, time.monotonic() + OBS_QUEUE_EXPIRY))
+            return None
+
+        req = self.state.begin(cmd)
+        if req is None:
+            self.logger.debug("Drop {}, OBS is {}.".format(cmd, self.state.name))
+        else:
+            self.journal.command(self.target, cmd, command.seq if command is not None else 0)
+        return req
+
+    def _send(self, name: str, cmd: Optional[str] = None) -> None:
+        if self.batched:
+            # OBS runs the request that applies to its real status and fails
+            # the others, the status at the end checks the result in the same
+            # round trip
+            reqs = [getattr(requests, item)() for item in BATCHES.get(cmd, (name,))]
+            reqs.append(requests.GetRecordingStatus())
+            future = self.ws.call_batch(reqs, timeout=max(self._timeout(req.name)
+                                                          for req in reqs))
+            self._track("RequestBatch", future)
+            future.add_done_callback(lambda f: self.call_done_sig.emit((name, reqs), f))
+        elif self.pipelined:
+            req = getattr(requests, name)()
+            future = self.ws.call_async(req, self._timeout(req.name))
+            self._track(req.name, future)
+            future.add_done_callback(lambda f: self.call_done_sig.emit(req, f))
+        else:
+            self._call_done(getattr(requests, name)(), None)
+
+    def _batch_done(self, name: str, reqs: List[requests.Baserequests], future: Future) -> None:
+        try:
+            future.result()
+        except:
+            self.logger.exception("ws.call_batch: Unexpected error: {}.".format(sys.exc_info()[0]))
+            self.state.finish(name, False)
+            self.reconcile()
+            return
+
+        *acts, status_flag = reqs
+        ok = any(req.status for req in acts)
+        if not ok:
+            self.logger.error("ws_call_batch Requests {} failed: {}."
+                              .format([req.name for req in acts],
+                                      [req.datain.get("error") for req in acts]))
+        self.state.finish(name, ok)
+        self._resumed(name, ok)
+
+        if status_flag.status:
+            self._set_status(self._recording_status(status_flag))
+        self.ui_update_sig.emit(self.status)
+
+    @pyqtSlot(object, object)
+    @tracer.traced("obs")
+    def _call_done(self, req, future: Optional[Future]) -> None:
+        if isinstance(req, tuple):
+            self._batch_done(*req, future)
+            return
+
+        ok = self._ws_call(req, future)
+        self.state.finish(req.name, ok)
+        self._resumed(req.name, ok)
+
+        if ok:
+            self._set_flags(self.state.status)
+            self.ui_update_sig.emit(self.status)
+        else:
+            self.reconcile()
+
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def start(self, command: Optional[Command] = None) -> None:
+        req = self._begin("start", command)
+        if req is not None:
+            self.logger.debug("Request starting.")
+            self._send(req)
+
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def stop(self, command: Optional[Command] = None) -> None:
+        req = self._begin("stop", command)
+        if req is not None:
+            self.logger.debug("Request directly stopping.")
+            self._send(req)
+
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def resume(self, command: Optional[Command] = None) -> None:
+        req = self._begin("resume", command)
+        if req is not None:
+            self.logger.debug("Request resuming.")
+            self._send(req)
+
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def pause(self, command: Optional[Command] = None) -> None:
+        req = self._begin("pause", command)
+        if req is not None:
+            self.logger.debug("Request pausing.")
+            self._send(req)
+
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def resume_or_start(self, command: Optional[Command] = None) -> None:
+        received = time.monotonic()
+        req = self._begin("resume_or_start", command)
+        # set before the request, obsws gets its reply inside _send
+        if req is not None and command is not None and command.origin:
+            self.resume_trace = (req, command.origin, command.issued, received, time.monotonic())
+        if req == "ResumeRecording":
+            self.logger.debug("Request resuming in resume_or_start, status is paused.")
+            self._send(req, "resume_or_start")
+        elif req == "StartRecording":
             self.logger.debug("Request resuming in resume_or_start, status is stopped.")
-            self._ws_call(requests.StartRecording())
+            self._send(req, "resume_or_start")
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.recording)
+    # the reply of the request of resume_or_start, after an input event
+    def _resumed(self, name: str, ok: bool) -> None:
+        if self.resume_trace is None or self.resume_trace[0] != name:
+            return
+        (_, origin, issued, received, sent), self.resume_trace = self.resume_trace, None
+        if not ok:
+            return
 
-    @pyqtSlot()
-    def paused_then_stop(self) -> None:
-        self._update_status()
-        if self.status == OBStatus.paused:
-            self.logger.debug("Request stopping when obs is paused.")
-            self._ws_call(requests.StopRecording())
+        stages = self.resume_latency.observe(origin, issued, received, sent, time.monotonic())
+        self.logger.info("Resumed {:.1f} ms after the input: input {:.1f}, dispatch {:.1f}, "
+                         "request {:.1f}, OBS {:.1f} ms; {}."
+                         .format(stages[-1] * 1000, *(stage * 1000 for stage in stages[:-1]),
+                                 self.resume_latency.summary()))
 
-            self._update_status()
-            self.ui_update_sig.emit(OBStatus.stopped)
+    @pyqtSlot(object)
+    @tracer.traced("obs")
+    def paused_then_stop(self, command: Optional[Command] = None) -> None:
+        req = self._begin("paused_then_stop", command)
+        if req is not None:
+            self.logger.debug("Request stopping when obs is paused.")
+            self._send(req)
@@ -0,0 +1,163 @@
+import json
+import asyncio
+import concurrent.futures
+from typing import List, Optional
+
+import websockets
+from obswebsocket import base_classes, exceptions
+from obswebsocket.core import RecvThread
+
+from AutoOBS.obs_async import AsyncObsws, auth_string
+
+
+RPC_VERSION = 1
+
+
+class OpCode:
+    hello = 0
+    identify = 1
+    identified = 2
+    event = 5
+    request = 6
+    request_response = 7
+    request_batch = 8
+    request_batch_response = 9
+
+
+class EventSubscription:
+    outputs = 1 << 6
+
+
+# AutoOBS only needs RecordStateChanged, which is in the outputs category
+EVENT_SUBSCRIPTIONS = EventSubscription.outputs
+
+# v4 request -> v5 request
+REQUEST_NAMES = {
+    "GetVersion": "GetVersion",
+    "GetRecordingStatus": "GetRecordStatus",
+    "StartRecording": "StartRecord",
+    "StopRecording": "StopRecord",
+    "PauseRecording": "PauseRecord",
+    "ResumeRecording": "ResumeRecord",
+}
+
+# outputState of RecordStateChanged -> v4 event
+RECORD_EVENTS = {
+    "OBS_WEBSOCKET_OUTPUT_STARTING": "RecordingStarting",
+    "OBS_WEBSOCKET_OUTPUT_STARTED": "RecordingStarted",
+    "OBS_WEBSOCKET_OUTPUT_STOPPING": "RecordingStopping",
+    "OBS_WEBSOCKET_OUTPUT_STOPPED": "RecordingStopped",
+    "OBS_WEBSOCKET_OUTPUT_PAUSED": "RecordingPaused",
+    "OBS_WEBSOCKET_OUTPUT_RESUMED": "RecordingResumed",
+}
+
+
+def to_v4_reply(message_id: str, name: str, result: dict) -> dict:
+    """Convert a v5 request result to the v4 reply obswebsocket requests take"""
+    status = result["requestStatus"]
+    reply = {"message-id": message_id}
+    if status["result"]:
+        reply["status"] = "ok"
+    else:
+        reply["status"] = "error"
+        reply["error"] = status.get("comment", "error code {}".format(status["code"]))
+
+    data = result.get("responseData") or {}
+    reply.update(data)
+    if name == "GetRecordingStatus":
+        reply["isRecording"] = data.get("outputActive", False)
+        reply["isRecordingPaused"] = data.get("outputPaused", False)
+
+    return reply
+
+
+class AsyncObsws5(AsyncObsws):
+    """obs-websocket v5 client with the interface of obswebsocket.obsws.
+
+    Requests and events are translated from and to their v4 counterparts,
+    so ObsWorker uses the same request objects with both protocols. Only
+    the output events are subscribed to, and call_batch() sends several
+    requests in one RequestBatch round trip.
+    """
+
+    async def _connect(self) -> None:
+        self.closing = False
+        self.conn = await websockets.connect("ws://{}:{}".format(self.host, self.port),
+                                             subprotocols=["obswebsocket.json"],
+                                             ping_interval=None, max_size=None)
+        await self._identify()
+        self.reader = asyncio.ensure_future(self._recv())
+
+    async def _identify(self) -> None:
+        hello = json.loads(await self.conn.recv())
+        if hello.get("op") != OpCode.hello:
+            raise exceptions.ConnectionFailure("Expected Hello, got {}".format(hello))
+
+        identify = {"rpcVersion": RPC_VERSION, "eventSubscriptions": EVENT_SUBSCRIPTIONS}
+        authentication = hello["d"].get("authentication")
+        if authentication is not None:
+            identify["authentication"] = auth_string(self.password, authentication["salt"],
+                                                     authentication["challenge"])
+        await self.conn.send(json.dumps({"op": OpCode.identify, "d": identify}))
+
+        try:
+            identified = json.loads(await self.conn.recv())
+        except websockets.exceptions.ConnectionClosed as e:
+            # wrong password or rpc version closes the connection
+            raise exceptions.ConnectionFailure("Identify refused: {}".format(e))
+        if identified.get("op") != OpCode.identified:
+            raise exceptions.ConnectionFailure("Expected Identified, got {}".format(identified))
+
+    def _dispatch(self, result: dict) -> None:
+        op = result.get("op")
+        data = result.get("d", {})
+        if op == OpCode.event:
+            name = None
+            if data.get("eventType") == "RecordStateChanged":
+                name = RECORD_EVENTS.get(data["eventData"].get("outputState"))
+            if name is not None:
+                self.eventmanager.trigger(RecvThread.build_event({"update-type": name}))
+        elif op in (OpCode.request_response, OpCode.request_batch_response):
+            self._answer(data["requestId"], data)
+
+    async def request(self, data: dict, timeout: Optional[float] = None) -> dict:
+        name = data.pop("request-type")
+        data.pop("message-id", None)
+
+        request_id = str(next(self.ids))
+        payload = {"op": OpCode.request,
+                   "d": {"requestType": REQUEST_NAMES.get(name, name),
+                         "requestId": request_id,
+                         "requestData": data}}
+        result = await self._exchange(request_id, payload, timeout)
+        return to_v4_reply(request_id, name, result)
+
+    async def _call_batch(self, objs: List[base_classes.Baserequests], halt_on_failure: bool,
+                          timeout: Optional[float]) -> List[base_classes.Baserequests]:
+        batch = []
+        for obj in objs:
+            data = obj.data()
+            name = data.pop("request-type")
+            batch.append({"requestType": REQUEST_NAMES.get(name, name), "requestData": data})
+
+        request_id = str(next(self.ids))
+        payload = {"op": OpCode.request_batch,
+                   "d": {"requestId": request_id,
+                         "haltOnFailure": halt_on_failure,
+                         "requests": batch}}
+        result = await self._exchange(request_id, payload, timeout)
+
+        # requests after a halt get no result
+        results = result["results"]
+        for i, obj in enumerate(objs):
+            if i < len(results):
+                obj.input(to_v4_reply(request_id, obj.name, results[i]))
+            else:
+                obj.input({"message-id": request_id, "status": "error", "error": "halted"})
+        return objs
+
+    def call_batch(self, objs: List[base_classes.Baserequests], halt_on_failure: bool = False,
+                   timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Send objs in one RequestBatch, the future is done when all are answered"""
+        return asyncio.run_coroutine_threadsafe(
+            self._call_batch(objs, halt_on_failure, timeout), self.loop)
@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import threading
+import importlib
+from typing import List
+from contextlib import contextmanager
+
+
+# third party modules timed one by one before AutoOBS imports them, in
+# dependency order so every module only pays for itself
+IMPORTS = ("toml", "PyQt5.QtCore", "PyQt5.QtGui", "PyQt5.QtWidgets", "pynput",
+           "websocket", "obswebsocket", "websockets")
+HEADLESS_SKIPS = ("PyQt5.QtGui", "PyQt5.QtWidgets")
+
+
+class StartupProfile:
+    """Wall clock phases of one startup, relative to the start of main().
+
+    Only --profile-startup enables it, phase() is a bare yield otherwise.
+    Phases may run in any thread, e.g. the OBS connect.
+    """
+
+    def __init__(self) -> None:
+        self.origin = None
+        self.output = None
+        self.phases: List[dict] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.origin is not None
+
+    def enable(self, origin: float, output: str = "-") -> None:
+        self.origin = origin
+        self.output = output
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.since(name, begin)
+
+    # for phases of straight-line code, begin is a time.perf_counter() value
+    def since(self, name: str, begin: float) -> None:
+        if self.enabled:
+            self._add(name, begin, time.perf_counter())
+
+    def mark(self, name: str) -> None:
+        if self.enabled:
+            now = time.perf_counter()
+            self._add(name, now, now)
+
+    def _add(self, name: str, begin: float, end: float) -> None:
+        self.phases.append({"name": name,
+                            "start": begin - self.origin,
+                            "duration": end - begin,
+                            "thread": threading.current_thread().name})
+
+    def import_modules(self, headless: bool) -> None:
+        for module in IMPORTS:
+            if headless and module in HEADLESS_SKIPS:
+                continue
+            with self.phase("import {}".format(module)):
+                importlib.import_module(module)
+
+    def report(self) -> str:
+        lines = ["{:>9} {:>9}  {}".format("start ms", "took ms", "phase")]
+        for phase in sorted(self.phases, key=lambda phase: phase["duration"], reverse=True):
+            lines.append("{:9.1f} {:9.1f}  {}".format(phase["start"] * 1000,
+                                                     phase["duration"] * 1000, phase["name"]))
+        return "\n".join(lines)
+
+    # once the startup is over, later reconnects are not recorded
+    def finish(self) -> None:
+        if not self.enabled:
+            return
+
+        if self.output == "-":
+            print(self.report())
+            sys.stdout.flush()
+        else:
+            with open(self.output, "w", encoding="utf-8") as f:
+                json.dump({"timestamp": time.time(), "argv": sys.argv,
+                           "phases": self.phases}, f, indent=2)
+        self.origin = None
+
+
+startup = StartupProfile()
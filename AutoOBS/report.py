@@ -0,0 +1,281 @@
+"""Recording report over AutoOBS logs and journals.
+
+Every stage is a generator, so logs and journals of any size are read in
+constant memory: lines or records become status events, events become
+status segments, segments are split at midnight and summed per session and
+per day.
+
+    python -m AutoOBS.report logs/*.log*
+    python -m AutoOBS.report logs/journal.bin
+
+Logs and journals cover the same runs, pass one kind or the other.
+"""
+import re
+import sys
+import gzip
+import heapq
+import json
+import argparse
+import datetime
+import itertools
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from AutoOBS import journal
+from AutoOBS.const import status_to_str, COUNTER_BOUND
+from AutoOBS.utils import hms
+
+
+class Event(NamedTuple):
+    time: datetime.datetime
+    target: str
+    # "status", "overflow" or "run", a new run of AutoOBS
+    kind: str
+    status: Optional[str] = None
+    # s of idle time recorded before an overflow paused or stopped OBS
+    idle: float = 0.0
+
+
+class Segment(NamedTuple):
+    target: str
+    session: int
+    status: str
+    begin: datetime.datetime
+    end: datetime.datetime
+    # the session is over with this segment
+    last: bool = False
+
+    @property
+    def seconds(self) -> float:
+        return (self.end - self.begin).total_seconds()
+
+
+LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) \| (?:\[(.+?)\] )?(.*)$")
+
+# log message -> status it reports, confirmed by OBS or requested of it,
+# the requests are only logged with --debug
+STATUS_MESSAGES = (
+    (re.compile(r"OBS is (\w+) now\."), None),
+    (re.compile(r"OBS status: (\w+)\."), None),
+    (re.compile(r"Request starting\."), "recording"),
+    (re.compile(r"Request resuming"), "recording"),
+    (re.compile(r"Request pausing\."), "paused"),
+    (re.compile(r"Request (directly )?stopping"), "stopped"),
+)
+OVERFLOW_MESSAGES = ("Normal time, emit pause.", "Time to stop working, emit stop.")
+RUN_MESSAGE = "Startup: interactive after"
+DEFAULT_TARGET = "obs"
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def log_events(path: str, counter_bound: float = COUNTER_BOUND) -> Iterator[Event]:
+    """Status events of a text log, plain or gzipped.
+
+    Logs do not hold the idle time of an overflow, counter_bound stands in.
+    """
+    with _open(path) as f:
+        for line in f:
+            match = LINE.match(line)
+            if match is None:
+                continue
+            when = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+            target = match.group(2) or DEFAULT_TARGET
+            message = match.group(3)
+
+            if message.startswith(RUN_MESSAGE):
+                yield Event(when, target, "run")
+            elif message in OVERFLOW_MESSAGES:
+                yield Event(when, target, "overflow", idle=counter_bound)
+            else:
+                for pattern, status in STATUS_MESSAGES:
+                    status_match = pattern.match(message)
+                    if status_match is not None:
+                        yield Event(when, target, "status", status or status_match.group(1))
+                        break
+
+
+def journal_events(path: str) -> Iterator[Event]:
+    """Status events of a binary journal, OBS are named by their index"""
+    origin = None
+    for record in journal.read(path):
+        if record.kind == journal.START:
+            origin = record.extra - record.t
+            yield Event(datetime.datetime.fromtimestamp(record.extra), DEFAULT_TARGET, "run")
+            continue
+        # the start of the oldest run was overwritten in the ring
+        if origin is None:
+            continue
+
+        when = datetime.datetime.fromtimestamp(origin + record.t)
+        if record.kind == journal.TRANSITION:
+            yield Event(when, "{} {}".format(DEFAULT_TARGET, record.target), "status",
+                        status_to_str.get(record.code))
+        elif record.kind == journal.OVERFLOW:
+            yield Event(when, DEFAULT_TARGET, "overflow", idle=record.extra)
+
+
+def events(paths: Iterable[str], counter_bound: float = COUNTER_BOUND) -> Iterator[Event]:
+    """The events of all files in time order, whatever order the paths come
+    in: rotated logs sort .log.1.gz after .log although they are older.
+    Every file is in time order on its own, so they are merged lazily.
+    """
+    streams = [journal_events(path) if path.endswith(".bin") else log_events(path, counter_bound)
+               for path in paths]
+    return heapq.merge(*streams, key=lambda event: event.time)
+
+
+def segments(stream: Iterable[Event],
+             overflows: Dict[int, Dict[datetime.date, float]]) -> Iterator[Segment]:
+    """Time spent in each status, a session runs from a start to a stop.
+
+    A run of AutoOBS that ended while OBS recorded closes its segment at
+    the last event of the run, what OBS did afterwards is not known.
+    overflows collects the idle seconds per session and day as a side
+    output, an overflow counts for every OBS that records.
+    """
+    status: Dict[str, str] = {}
+    since: Dict[str, datetime.datetime] = {}
+    session: Dict[str, int] = {}
+    last = None
+    count = itertools.count(1)
+
+    def close(target: str, when: datetime.datetime, new_status: str) -> Iterator[Segment]:
+        if status.get(target, "stopped") != "stopped":
+            yield Segment(target, session[target], status[target], since[target], when,
+                          new_status == "stopped")
+        elif new_status != "stopped":
+            session[target] = next(count)
+        status[target] = new_status
+        since[target] = when
+
+    for event in stream:
+        if event.kind == "run":
+            for target in list(status):
+                yield from close(target, last or event.time, "stopped")
+        elif event.kind == "overflow":
+            for target in status:
+                if status[target] != "stopped":
+                    idle = overflows[session[target]]
+                    idle[event.time.date()] = idle.get(event.time.date(), 0.0) + event.idle
+        elif event.status is not None and event.status != status.get(event.target, "stopped"):
+            yield from close(event.target, event.time, event.status)
+        last = event.time
+
+    for target in list(status):
+        yield from close(target, last, "stopped")
+
+
+def split_days(stream: Iterable[Segment]) -> Iterator[Segment]:
+    for segment in stream:
+        begin = segment.begin
+        while begin.date() < segment.end.date():
+            midnight = datetime.datetime.combine(begin.date() + datetime.timedelta(days=1),
+                                                 datetime.time())
+            yield segment._replace(begin=begin, end=midnight, last=False)
+            begin = midnight
+        yield segment._replace(begin=begin)
+
+
+class Totals:
+    """Recorded and paused seconds, pause cycles and idle lost to the counter"""
+
+    __slots__ = ("first", "last", "recorded", "paused", "pauses", "idle")
+
+    def __init__(self) -> None:
+        self.first = None
+        self.last = None
+        self.recorded = 0.0
+        self.paused = 0.0
+        self.pauses = 0
+        self.idle = 0.0
+
+    def add(self, segment: Segment, new_pause: bool) -> None:
+        if self.first is None:
+            self.first = segment.begin
+        self.last = segment.end
+        if segment.status == "recording":
+            self.recorded += segment.seconds
+        elif segment.status == "paused":
+            self.paused += segment.seconds
+            self.pauses += new_pause
+
+    def as_dict(self) -> dict:
+        return {"first": self.first.isoformat() if self.first else None,
+                "last": self.last.isoformat() if self.last else None,
+                "recorded": round(self.recorded, 1),
+                "paused": round(self.paused, 1),
+                "pauses": self.pauses,
+                "idle_lost": round(self.idle, 1)}
+
+
+def _row(name: str, totals: Totals) -> str:
+    return "{:<24} {:>10} {:>10} {:>7} {:>10}".format(
+        name, hms(totals.recorded), hms(totals.paused), totals.pauses, hms(totals.idle))
+
+
+HEADER = "{:<24} {:>10} {:>10} {:>7} {:>10}".format("", "recorded", "paused", "pauses", "idle lost")
+
+
+def report(paths: List[str], counter_bound: float = COUNTER_BOUND, as_json: bool = False,
+           out=sys.stdout) -> None:
+    overflows = defaultdict(dict)
+    days: Dict[datetime.date, Totals] = defaultdict(Totals)
+    # only the sessions in progress and the days are kept
+    sessions: Dict[int, Totals] = {}
+    previous: Dict[int, str] = {}
+
+    def finish_session(segment: Segment) -> None:
+        totals = sessions.pop(segment.session)
+        previous.pop(segment.session)
+        for day, idle in overflows.pop(segment.session, {}).items():
+            totals.idle += idle
+            days[day].idle += idle
+        name = "{} #{}".format(segment.target, segment.session)
+        if as_json:
+            out.write(json.dumps(dict(totals.as_dict(), session=name)) + "\n")
+        else:
+            out.write(_row(name, totals) + "  {} - {}\n".format(
+                totals.first.strftime("%Y-%m-%d %H:%M"), totals.last.strftime("%H:%M")))
+
+    if not as_json:
+        out.write("Sessions\n" + HEADER + "\n")
+
+    for segment in split_days(segments(events(paths, counter_bound), overflows)):
+        totals = sessions.setdefault(segment.session, Totals())
+        new_pause = segment.status == "paused" and previous.get(segment.session) != "paused"
+        totals.add(segment, new_pause)
+        days[segment.begin.date()].add(segment, new_pause)
+        previous[segment.session] = segment.status
+        if segment.last:
+            finish_session(segment)
+
+    if as_json:
+        for day in sorted(days):
+            out.write(json.dumps(dict(days[day].as_dict(), day=day.isoformat())) + "\n")
+    else:
+        out.write("\nDays\n" + HEADER + "\n")
+        for day in sorted(days):
+            out.write(_row(day.isoformat(), days[day]) + "\n")
+    out.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.report",
+                                     description="Recorded and paused time per session and day.")
+    parser.add_argument("paths", nargs="+",
+                        help="AutoOBS logs (.log, rotated .log.N.gz) or journals (.bin), oldest first")
+    parser.add_argument("--counter-bound", type=float, default=COUNTER_BOUND,
+                        help="counter_bound of the logged runs, the idle lost per pause in logs")
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    report(args.paths, args.counter_bound, args.json)
+
+
+if __name__ == "__main__":
+    main()
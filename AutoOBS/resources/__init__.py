@@ -0,0 +1,4 @@
+import os
+
+
+RCC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources.rcc")
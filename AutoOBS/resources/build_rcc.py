@@ -0,0 +1,39 @@
+"""Write resources.rcc, the binary form of the compiled resources.py.
+
+pyrcc5 only generates Python modules, so the tree, names and data of the
+generated module are put into the .rcc layout rcc -binary would write. Run
+it after regenerating resources.py:
+
+    pyrcc5 AutoOBS/resources/raw/resources.qrc -o AutoOBS/resources/resources.py
+    python -m AutoOBS.resources.build_rcc
+"""
+import os
+import struct
+
+from AutoOBS.resources import RCC_FILE
+
+
+# magic, version and the offsets of tree, data and names
+HEADER = struct.Struct(">4siiii")
+
+
+def build_rcc(path: str = RCC_FILE) -> int:
+    from AutoOBS.resources import resources
+
+    tree = resources.qt_resource_struct_v2
+    data = resources.qt_resource_data
+    names = resources.qt_resource_name
+
+    tree_offset = HEADER.size
+    data_offset = tree_offset + len(tree)
+    names_offset = data_offset + len(data)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(b"qres", 2, tree_offset, data_offset, names_offset))
+        f.write(tree)
+        f.write(data)
+        f.write(names)
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    print("{} bytes written to {}".format(build_rcc(), RCC_FILE))
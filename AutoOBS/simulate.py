@@ -0,0 +1,228 @@
+"""Deterministic simulation of the idle engine on virtual time.
+
+Counter, CountWorker and ListenWorker run as they do in AutoOBS, on a
+VirtualClock instead of the system clocks and without an event loop: a
+scripted activity trace is fed to ListenWorker.on_event and the count timer
+fires when the trace passes its deadline. The commands they emit go through
+the RecordStateMachine of a perfect OBS, which answers every request at
+once. A day of input events takes a fraction of a second.
+
+    python -m AutoOBS.simulate benchmarks/workday.toml
+
+A scenario is a TOML file:
+
+    start = 2026-01-05T08:00:00
+    hours = 24
+    counter_bound = 10
+    listener_timer_time = 100
+    stop_times = [01:00:00]
+
+    # an input event every `every` s from `begin` to `end`
+    activity = [
+        {begin = 2026-01-05T08:00:00, end = 2026-01-05T12:00:00, every = 1},
+    ]
+
+    # the status transitions of OBS, within tolerance s, default 1
+    expect = [
+        {at = 2026-01-05T08:00:00, status = "recording"},
+        {at = 2026-01-05T12:00:10, status = "paused"},
+    ]
+"""
+import sys
+import time
+import logging
+import argparse
+import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+import toml
+
+from AutoOBS.const import OBStatus, status_to_str, LISTENER_TIMER_TIME, COUNTER_BOUND
+from AutoOBS.conf import ConfError
+from AutoOBS.utils import StopSchedule, VirtualClock
+from AutoOBS.state import RecordStateMachine
+from AutoOBS.journal import Journal
+from AutoOBS.worker import Counter, CountWorker, ListenWorker
+
+
+class VirtualTimer:
+    """Single shot timer of CountWorker on a VirtualClock, the simulation
+    fires it once the clock reaches its deadline.
+    """
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.deadline = None
+
+    def start(self, msec: int) -> None:
+        self.deadline = self.clock.monotonic() + msec / 1000
+
+    def stop(self) -> None:
+        self.deadline = None
+
+    def isActive(self) -> bool:
+        return self.deadline is not None
+
+
+class Step(NamedTuple):
+    time: datetime.datetime
+    command: str
+    # the request sent to OBS, None when the command was dropped
+    request: Optional[str]
+    status: str
+
+
+class Simulation:
+
+    def __init__(self, start: datetime.datetime, counter_bound: float = COUNTER_BOUND,
+                 listener_timer_time: int = LISTENER_TIMER_TIME,
+                 stop_schedule: StopSchedule = StopSchedule(()),
+                 logger: Optional[logging.Logger] = None) -> None:
+        logger = logger or logging.getLogger("AutoOBS.simulate")
+        self.clock = VirtualClock(start)
+        self.timer = VirtualTimer(self.clock)
+        # the journal is not part of the simulation, its records would be on
+        # the system clock
+        journal = Journal(None, capacity=1)
+
+        self.counter = Counter(counter_bound, logger, self.clock)
+        self.count_worker = CountWorker(stop_schedule, self.counter, journal, logger, self.timer)
+        self.listen_worker = ListenWorker(listener_timer_time, self.counter, journal, logger)
+
+        # the connections of Engine in auto mode, direct calls in this thread
+        self.listen_worker.resume_sig.connect(lambda origin: self.command("resume_or_start"))
+        self.listen_worker.active_sig.connect(self.count_worker.wake)
+        self.count_worker.pause.connect(lambda: self.command("pause"))
+        self.count_worker.stop.connect(lambda: self.command("paused_then_stop"))
+
+        self.state = RecordStateMachine()
+        # (t, command, request, status), most commands of a day are resumes
+        # dropped while recording, Steps are only made for the output
+        self.log: List[tuple] = []
+
+    def command(self, cmd: str) -> None:
+        req = self.state.begin(cmd)
+        if req is not None:
+            self.state.finish(req, True)
+        self.log.append((self.clock.t, cmd, req, self.state.status))
+
+    def _step(self, entry: tuple) -> Step:
+        t, cmd, req, status = entry
+        return Step(self.clock.start + datetime.timedelta(seconds=t), cmd, req,
+                    status_to_str[status])
+
+    @property
+    def steps(self) -> List[Step]:
+        return [self._step(entry) for entry in self.log]
+
+    def _fire(self, until: float) -> None:
+        while self.timer.deadline is not None and self.timer.deadline <= until:
+            self.clock.t = self.timer.deadline
+            self.timer.deadline = None
+            self.count_worker.timeout()
+
+    def run(self, inputs: Iterable[float], duration: float) -> None:
+        """Feed the input events, s since start in order, until duration"""
+        self.count_worker.set_active(True)
+        for t in inputs:
+            if t > duration:
+                break
+            self._fire(t)
+            self.clock.t = t
+            self.listen_worker.on_event()
+        self._fire(duration)
+        self.clock.t = duration
+
+    def transitions(self) -> Iterator[Step]:
+        """The steps that changed the status of OBS"""
+        status = OBStatus.stopped
+        for entry in self.log:
+            if entry[3] != status:
+                status = entry[3]
+                yield self._step(entry)
+
+
+def activity(start: datetime.datetime, bursts: Iterable[dict]) -> Iterator[float]:
+    """Input events of the activity bursts of a scenario, s since start"""
+    for burst in sorted(bursts, key=lambda burst: burst["begin"]):
+        t = (burst["begin"] - start).total_seconds()
+        end = (burst["end"] - start).total_seconds()
+        every = burst.get("every", 1)
+        while t <= end:
+            yield t
+            t += every
+
+
+def check(transitions: List[Step], expect: List[dict], tolerance: float) -> List[str]:
+    """Differences between the transitions and the expected ones"""
+    errors = []
+    for i in range(max(len(transitions), len(expect))):
+        got = transitions[i] if i < len(transitions) else None
+        want = expect[i] if i < len(expect) else None
+        if got is None:
+            errors.append("missing {} at {}".format(want["status"], want["at"]))
+        elif want is None:
+            errors.append("unexpected {} at {}".format(got.status, got.time))
+        elif (got.status != want["status"]
+              or abs((got.time - want["at"]).total_seconds()) > tolerance):
+            errors.append("expected {} at {}, got {} at {}".format(
+                want["status"], want["at"], got.status, got.time))
+    return errors
+
+
+def load_scenario(path: str) -> dict:
+    try:
+        scenario = toml.load(path)
+    except toml.TomlDecodeError as e:
+        raise ConfError("TomlDecodeError: \"{}\"!".format(e.args[0]))
+    for key in ("start", "hours"):
+        if key not in scenario:
+            raise ConfError("Scenario key \"{}\" does not exist!".format(key))
+    return scenario
+
+
+def run_scenario(scenario: dict) -> Simulation:
+    start = scenario["start"]
+    simulation = Simulation(start, scenario.get("counter_bound", COUNTER_BOUND),
+                            scenario.get("listener_timer_time", LISTENER_TIMER_TIME),
+                            StopSchedule(scenario.get("stop_times", [])))
+    simulation.run(activity(start, scenario.get("activity", [])), scenario["hours"] * 3600)
+    return simulation
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.simulate",
+                                     description="Run the idle engine on virtual time.")
+    parser.add_argument("scenario", help="scenario TOML file")
+    parser.add_argument("--all", action="store_true",
+                        help="print every command, also the dropped ones")
+    args = parser.parse_args()
+
+    try:
+        scenario = load_scenario(args.scenario)
+    except ConfError as e:
+        parser.error(str(e))
+
+    begin = time.perf_counter()
+    simulation = run_scenario(scenario)
+    elapsed = time.perf_counter() - begin
+
+    transitions = list(simulation.transitions())
+    for step in simulation.steps if args.all else transitions:
+        print("{} | {:<17} {:<16} {}".format(step.time, step.command,
+                                             step.request or "dropped", step.status))
+    print("{} commands, {} transitions, {} counter wakeups in {:.1f} ms"
+          .format(len(simulation.log), len(transitions), simulation.count_worker.wakeups,
+                  elapsed * 1000))
+
+    if "expect" in scenario:
+        errors = check(transitions, scenario["expect"], scenario.get("tolerance", 1))
+        for error in errors:
+            print(error)
+        print("FAILED" if errors else "OK")
+        sys.stdout.flush()
+        sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
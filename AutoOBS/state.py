@@ -0,0 +1,188 @@
+import time
+import threading
+import itertools
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from AutoOBS.const import OBStatus, status_to_str, OBS_COMMAND_DEADLINE
+
+
+# command -> {status it applies to: (obs-websocket request, status after it)}
+TRANSITIONS = {
+    "start": {
+        OBStatus.stopped: ("StartRecording", OBStatus.recording),
+    },
+    "stop": {
+        OBStatus.recording: ("StopRecording", OBStatus.stopped),
+        OBStatus.paused: ("StopRecording", OBStatus.stopped),
+    },
+    "pause": {
+        OBStatus.recording: ("PauseRecording", OBStatus.paused),
+    },
+    "resume": {
+        OBStatus.paused: ("ResumeRecording", OBStatus.recording),
+    },
+    "resume_or_start": {
+        OBStatus.paused: ("ResumeRecording", OBStatus.recording),
+        OBStatus.stopped: ("StartRecording", OBStatus.recording),
+    },
+    "paused_then_stop": {
+        OBStatus.paused: ("StopRecording", OBStatus.stopped),
+    },
+}
+
+# command -> status it leads to
+TARGETS = {cmd: next(iter(transitions.values()))[1]
+           for cmd, transitions in TRANSITIONS.items()}
+
+pending_to_str = {
+    "StartRecording": "starting",
+    "StopRecording": "stopping",
+    "PauseRecording": "pausing",
+    "ResumeRecording": "resuming",
+}
+
+
+class RecordStateMachine:
+    """Recording state of OBS and the requests in flight to change it.
+
+    Commands are checked against the state OBS will be in once the requests
+    in flight are done, so a command that is already satisfied or already
+    requested is dropped instead of being sent again.
+    """
+
+    def __init__(self, status: OBStatus = OBStatus.stopped) -> None:
+        self.status = status
+        self.inflight: List[Tuple[str, OBStatus]] = []
+
+        self.sent: Dict[str, int] = defaultdict(int)
+        # dropped because OBS is already in the target status
+        self.satisfied: Dict[str, int] = defaultdict(int)
+        # dropped because a request in flight leads to the target status
+        self.duplicated: Dict[str, int] = defaultdict(int)
+
+        self.lock = threading.Lock()
+
+    @property
+    def expected(self) -> OBStatus:
+        if self.inflight:
+            return self.inflight[-1][1]
+        return self.status
+
+    @property
+    def name(self) -> str:
+        if self.inflight:
+            return pending_to_str[self.inflight[-1][0]]
+        return status_to_str[self.status]
+
+    @property
+    def suppressed(self) -> int:
+        return sum(self.satisfied.values()) + sum(self.duplicated.values())
+
+    def begin(self, cmd: str) -> Optional[str]:
+        """Return the request to send for cmd, None if it is not needed"""
+        with self.lock:
+            transition = TRANSITIONS[cmd].get(self.expected)
+            if transition is None:
+                if self.inflight:
+                    self.duplicated[cmd] += 1
+                else:
+                    self.satisfied[cmd] += 1
+                return None
+
+            self.inflight.append(transition)
+            self.sent[transition[0]] += 1
+            return transition[0]
+
+    # replies come in request order on one connection, so req can only be
+    # the oldest request in flight, unless its event already took it out
+    def finish(self, req: str, ok: bool) -> None:
+        with self.lock:
+            if self.inflight and self.inflight[0][0] == req:
+                target = self.inflight.pop(0)[1]
+                if ok:
+                    self.status = target
+
+    # OBS reported status by an event
+    def observe(self, status: OBStatus) -> None:
+        with self.lock:
+            self.status = status
+            if self.inflight and self.inflight[0][1] == status:
+                self.inflight.pop(0)
+
+    def set_status(self, status: OBStatus) -> None:
+        with self.lock:
+            self.status = status
+
+    # after a reconnect, nothing sent before is in flight any more
+    def resync(self, status: OBStatus) -> None:
+        with self.lock:
+            self.status = status
+            self.inflight.clear()
+
+
+class Command(NamedTuple):
+    name: str
+    seq: int
+    # monotonic time it was issued, and of the input event that led to it,
+    # 0 if none did
+    issued: float = 0.0
+    origin: float = 0.0
+
+
+class CommandBoard:
+    """Commands issued to ObsWorker that did not run yet.
+
+    Commands wait in the event queue of the obs thread while a request
+    blocks it. When its turn comes, a command is dropped if its deadline
+    passed or a newer command superseded it. A newer command supersedes an
+    older one unless it only applies to the status the older one leads to,
+    like paused_then_stop after pause, so a repeat of a command or a resume
+    after a pause that never ran replaces it.
+    """
+
+    # shared by all boards, the same command is posted to every ObsWorker
+    ids = itertools.count(1)
+
+    # every board applies its own deadline to the time a command was issued
+    def __init__(self, deadline: float = OBS_COMMAND_DEADLINE) -> None:
+        self.deadline = deadline
+        self.pending: List[Command] = []
+
+        self.expired: Dict[str, int] = defaultdict(int)
+        self.superseded: Dict[str, int] = defaultdict(int)
+
+        self.lock = threading.Lock()
+
+    def make(self, cmd: str, origin: float = 0.0) -> Command:
+        now = time.monotonic()
+        return Command(cmd, next(self.ids), now, origin)
+
+    # called from the thread issuing the command
+    def post(self, command: Command) -> None:
+        with self.lock:
+            self.pending.append(command)
+
+    def issue(self, cmd: str) -> Command:
+        command = self.make(cmd)
+        self.post(command)
+        return command
+
+    @staticmethod
+    def supersedes(newer: str, older: str) -> bool:
+        return set(TRANSITIONS[newer]) != {TARGETS[older]}
+
+    def claim(self, command: Command) -> Optional[str]:
+        """Take command off the board, return why it is stale or None"""
+        with self.lock:
+            if command in self.pending:
+                self.pending.remove(command)
+
+            if time.monotonic() > command.issued + self.deadline:
+                self.expired[command.name] += 1
+                return "expired"
+            for newer in self.pending:
+                if newer.seq > command.seq and self.supersedes(newer.name, command.name):
+                    self.superseded[command.name] += 1
+                    return "superseded by {}".format(newer.name)
+            return None
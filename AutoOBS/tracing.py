@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from AutoOBS.const import LOG_PATH, TRACE_EVENTS
+
+
+class Tracer:
+    """Spans and instant events of all threads, for Perfetto or chrome://tracing.
+
+    Until enable() every call is one attribute check. After it, an event is
+    a tuple appended to a bounded deque, the oldest events are dropped once
+    it is full. dump() writes the buffer as Chrome trace JSON.
+
+    traced() decides when the method is defined, so enable() has to come
+    before the AutoOBS modules are imported, like --trace does.
+    """
+
+    def __init__(self) -> None:
+        self.events = None
+        self.output = None
+        self.origin = 0.0
+        # thread ident -> name, for the thread_name metadata events
+        self.threads = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.events is not None
+
+    # output None dumps to a new file in LOG_PATH every time
+    def enable(self, output: Optional[str] = None, size: int = TRACE_EVENTS) -> None:
+        self.events = deque(maxlen=size)
+        self.output = output
+        self.origin = time.perf_counter()
+
+    def name_thread(self, name: str) -> None:
+        """Name the calling thread, QThreads and pynput threads have none"""
+        if self.enabled:
+            threading.current_thread().name = name
+            self.threads[threading.get_ident()] = name
+
+    def _tid(self) -> int:
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        return tid
+
+    # begin and end are time.perf_counter() values
+    def complete(self, name: str, cat: str, begin: float, end: float,
+                 args: Optional[dict] = None) -> None:
+        if self.enabled:
+            self.events.append(("X", name, cat, begin, end - begin, self._tid(), args))
+
+    # an async slice on a track of its own, for spans that overlap, like
+    # pipelined requests
+    def async_span(self, name: str, cat: str, begin: float, end: float,
+             args: Optional[dict] = None) -> None:
+        if self.enabled:
+            self.events.append(("A", name, cat, begin, end - begin, self._tid(), args))
+
+    def instant(self, name: str, cat: str, args: Optional[dict] = None) -> None:
+        if self.enabled:
+            self.events.append(("i", name, cat, time.perf_counter(), 0.0, self._tid(), args))
+
+    @contextmanager
+    def span(self, name: str, cat: str, args: Optional[dict] = None):
+        if not self.enabled:
+            yield
+            return
+
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, begin, time.perf_counter(), args)
+
+    def traced(self, cat: str):
+        """Decorator, a span per call named after the method"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            name = func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                begin = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.complete(name, cat, begin, time.perf_counter())
+            return wrapper
+        return decorator
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid()
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid,
+                         "args": {"name": "AutoOBS"}}]
+        trace_events.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                             "args": {"name": name}}
+                            for tid, name in list(self.threads.items()))
+
+        # a copy, the other threads keep appending
+        for i, (ph, name, cat, begin, dur, tid, args) in enumerate(list(self.events)):
+            event = {"name": name, "cat": cat, "ph": ph, "pid": pid, "tid": tid,
+                     "ts": round((begin - self.origin) * 1e6, 1)}
+            if args:
+                event["args"] = args
+            if ph == "X":
+                event["dur"] = round(dur * 1e6, 1)
+            elif ph == "A":
+                event.update(ph="b", id=i)
+                trace_events.append(event)
+                event = dict(event, ph="e", ts=round((begin + dur - self.origin) * 1e6, 1))
+            else:
+                event["s"] = "t"
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms",
+                "otherData": {"started": time.time() - (time.perf_counter() - self.origin),
+                              # older events were dropped
+                              "full": len(self.events) == self.events.maxlen}}
+
+    def dump(self) -> Optional[str]:
+        """Write the buffer, return the file name, None when disabled"""
+        if not self.enabled:
+            return None
+
+        path = self.output
+        if path is None:
+            os.makedirs(LOG_PATH, exist_ok=True)
+            path = os.path.join(LOG_PATH, "trace_{}.json".format(time.strftime("%Y-%m-%d_%H-%M-%S")))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+tracer = Tracer()
@@ -0,0 +1,257 @@
+"""Offline tuning of counter_bound and listener_timer_time.
+
+Replays recorded input activity for a whole grid of parameter values at
+once and reports, per combination, the recorded time, the idle time that
+was recorded anyway and the pause/resume cycles.
+
+    python -m AutoOBS.tune logs/journal.bin
+    python -m AutoOBS.tune events.txt --counter-bound 5:120:5 --listener-timer-time 100,1000,5000
+
+Inputs are journals (.bin), NumPy arrays (.npy) or text files with one
+timestamp in s per line. A journal holds activity bursts, events closer
+than JOURNAL_BURST_GAP, and their number, the events are spread evenly
+over their burst, so its replay is exact for bounds above that gap.
+
+The model is the idle engine of AutoOBS: OBS pauses counter_bound after the
+last input event and resumes with the next one. The counter timer is armed
+for that deadline, there is no polling interval to tune. A resume is
+emitted at most once per listener_timer_time, which only delays a resume
+when it is longer than the pause before it. Up to counter_bound it only
+sets the number of resume signals, above it the resumes wait for the
+next signal, which is replayed exactly. Every gap between events is
+handled with sorted gaps and cumulative sums and the signals are followed
+for all stretches of activity at once, no Python loop runs per event.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from AutoOBS import journal
+from AutoOBS.const import LISTENER_TIMER_TIME, JOURNAL_BURST_GAP
+from AutoOBS.utils import hms
+
+
+# s between the runs laid out on one time line, so no gap crosses runs
+RUN_SEPARATION = 1e9
+
+
+def expand_bursts(bursts: np.ndarray) -> np.ndarray:
+    """Input events of journal bursts (begin, seconds, events), spread evenly
+    over every burst, all closer than JOURNAL_BURST_GAP like the real ones
+    """
+    begins, lengths, counts = bursts[:, 0], bursts[:, 1], np.maximum(bursts[:, 2], 1).astype(int)
+    index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    step = np.where(counts > 1, lengths / np.maximum(counts - 1, 1), 0.0)
+    return np.sort(np.repeat(begins, counts) + index * np.repeat(step, counts))
+
+
+def load_runs(path: str) -> List[np.ndarray]:
+    """Sorted input timestamps in s, one array per run of AutoOBS"""
+    if path.endswith(".bin"):
+        runs = [[]]
+        for record in journal.read(path):
+            if record.kind == journal.START:
+                runs.append([])
+            elif record.kind == journal.ACTIVITY:
+                runs[-1].append((record.t, record.extra, record.value))
+        return [expand_bursts(np.array(run)) for run in runs if run]
+    elif path.endswith(".npy"):
+        return [np.sort(np.load(path).astype(float).ravel())]
+    return [np.sort(np.loadtxt(path, ndmin=1, comments="#"))]
+
+
+def timeline(runs: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """The runs one after the other, RUN_SEPARATION apart, and the index of
+    the first event of every run
+    """
+    shifted = []
+    end = 0.0
+    for run in runs:
+        shifted.append(run - run[0] + end)
+        end = shifted[-1][-1] + RUN_SEPARATION
+    starts = np.cumsum([0] + [len(run) for run in shifted[:-1]])
+    return np.concatenate(shifted), starts
+
+
+def _stretches(t: np.ndarray, starts: np.ndarray, timer_time: float) -> np.ndarray:
+    """Index of the first event of every stretch of activity, events closer
+    than timer_time within one run
+    """
+    splits = np.diff(t) >= timer_time
+    splits[starts[1:] - 1] = True
+    return np.concatenate(([0], np.nonzero(splits)[0] + 1))
+
+
+def _signals(t: np.ndarray, starts: np.ndarray, timer_time: float) -> np.ndarray:
+    """Index of every event that emits a resume signal, in order.
+
+    The first event of a stretch emits one, then the first event once
+    timer_time passed since the last signal. The chains of all stretches
+    are followed side by side, one step per signal of the longest stretch.
+    """
+    edges = _stretches(t, starts, timer_time)
+    limits = np.append(edges[1:], len(t))
+    following = np.searchsorted(t, t + timer_time)
+    emitted = np.zeros(len(t), dtype=bool)
+    current = edges
+    while len(current):
+        emitted[current] = True
+        current = following[current]
+        keep = current < limits
+        current, limits = current[keep], limits[keep]
+    return np.nonzero(emitted)[0]
+
+
+def tune(runs: Sequence[np.ndarray], bounds: np.ndarray, timer_times: np.ndarray,
+         idle_gap: float = JOURNAL_BURST_GAP) -> Dict[str, np.ndarray]:
+    """Replay runs for every bound (s) and timer time (s).
+
+    Returns arrays of shape (len(bounds), len(timer_times)):
+
+    - recorded: s OBS recorded, from the first event of a run until it
+      paused after the last one
+    - idle: s of the recorded time without input, beyond idle_gap after an
+      event
+    - skipped: s OBS was paused, recorded + skipped is the time from the
+      first event of every run until bound after its last one
+    - cycles: pauses followed by a resume
+    - signals: resume signals the listener emitted, about one per
+      timer_time of activity
+    """
+    runs = [run for run in runs if len(run)]
+    bounds = np.asarray(bounds, dtype=float)
+    timer_times = np.asarray(timer_times, dtype=float)
+    shape = (len(bounds), len(timer_times))
+    if not runs:
+        return {name: np.zeros(shape)
+                for name in ("recorded", "idle", "skipped", "cycles", "signals")}
+
+    t, starts = timeline(runs)
+    gaps = np.diff(t)
+    # the gaps between runs are not idle time
+    gaps[starts[1:] - 1] = 0.0
+    # index of the last event of every run
+    lasts = np.append(starts[1:], len(t)) - 1
+
+    sorted_gaps = np.sort(gaps)
+    cumulative = np.concatenate(([0.0], np.cumsum(sorted_gaps)))
+    n = len(gaps)
+
+    # gaps up to the bound are recorded in full, longer ones up to the bound
+    below = np.searchsorted(sorted_gaps, bounds, side="right")
+    above = n - below
+    recorded = cumulative[below] + bounds * above + bounds * len(runs)
+    skipped = (cumulative[n] - cumulative[below]) - bounds * above
+
+    # idle is what a gap has beyond idle_gap, as far as it was recorded
+    quiet = np.searchsorted(sorted_gaps, idle_gap, side="right")
+    idle = np.where(bounds > idle_gap,
+                    (cumulative[np.maximum(below, quiet)] - cumulative[quiet])
+                    - idle_gap * np.maximum(below - quiet, 0)
+                    + (bounds - idle_gap) * above,
+                    0.0)
+
+    # the signals themselves are only kept for the timer times above a bound
+    counts = []
+    signals = []
+    for timer_time in timer_times:
+        emits = _signals(t, starts, timer_time)
+        counts.append(float(len(emits)))
+        signals.append(emits if timer_time > bounds.min() else None)
+    result = {"recorded": np.repeat(recorded[:, None], len(timer_times), axis=1),
+              "idle": np.repeat(idle[:, None], len(timer_times), axis=1),
+              "skipped": np.repeat(skipped[:, None], len(timer_times), axis=1),
+              "cycles": np.repeat(above[:, None], len(timer_times), axis=1).astype(float),
+              "signals": np.repeat([counts], len(bounds), axis=0)}
+
+    # a timer_time up to the bound always resumes with the event that ends
+    # a pause, above it the resume waits for the next signal: the pauses
+    # until then arm no timer and only the first one counts
+    for i in np.nonzero(np.any(timer_times[None, :] > bounds[:, None], axis=1))[0]:
+        bound = bounds[i]
+        paused = np.nonzero(gaps > bound)[0]
+        if not len(paused):
+            continue
+        begins = t[paused] + bound
+        runs_last = lasts[np.searchsorted(starts, paused, side="right") - 1]
+        beyond = np.maximum(np.minimum(gaps, bound) - idle_gap, 0.0)
+        quiet_sum = np.concatenate(([0.0], np.cumsum(beyond)))
+
+        for j in np.nonzero(timer_times > bound)[0]:
+            emits = np.append(signals[j], len(t))
+            resumes = emits[np.searchsorted(emits, paused + 1)]
+            first = np.concatenate(([True], resumes[1:] != resumes[:-1]))
+            resumes, last, begin = resumes[first], runs_last[first], begins[first]
+            # a pause without a signal after it in its run lasts until the end
+            resumed = resumes <= last
+            ends = np.minimum(resumes, last)
+            paused_time = np.sum(np.where(resumed, t[ends], t[last] + bound) - begin)
+            unrecorded = quiet_sum[ends] - quiet_sum[paused[first] + 1]
+
+            result["recorded"][i, j] = cumulative[n] + bound * len(runs) - paused_time
+            result["skipped"][i, j] = paused_time
+            result["idle"][i, j] = idle[i] - np.sum(unrecorded)
+            result["cycles"][i, j] = np.count_nonzero(resumed)
+    return result
+
+
+def parse_grid(text: str) -> np.ndarray:
+    """"a,b,c" or "start:stop:step", stop included"""
+    if ":" in text:
+        start, stop, step = (float(item) for item in text.split(":"))
+        return np.arange(start, stop + step / 2, step)
+    return np.array([float(item) for item in text.split(",")])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m AutoOBS.tune",
+                                     description="Replay input activity for a grid of thresholds.")
+    parser.add_argument("paths", nargs="+",
+                        help="journals (.bin), .npy arrays or text files of timestamps in s")
+    parser.add_argument("--counter-bound", type=parse_grid, default=parse_grid("5:120:5"),
+                        help="s, a list a,b,c or a range start:stop:step, default 5:120:5")
+    parser.add_argument("--listener-timer-time", type=parse_grid,
+                        default=np.array([float(LISTENER_TIMER_TIME)]),
+                        help="ms, a list or a range, default {}".format(LISTENER_TIMER_TIME))
+    parser.add_argument("--idle-gap", type=float, default=JOURNAL_BURST_GAP,
+                        help="s after an input event that still count as active, default {}"
+                             .format(JOURNAL_BURST_GAP))
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args()
+
+    runs = [run for path in args.paths for run in load_runs(path)]
+    begin = time.perf_counter()
+    result = tune(runs, args.counter_bound, args.listener_timer_time / 1000, args.idle_gap)
+    elapsed = time.perf_counter() - begin
+
+    if not args.json:
+        print("{} events in {} runs, {} combinations in {:.1f} ms".format(
+            sum(len(run) for run in runs), len(runs),
+            len(args.counter_bound) * len(args.listener_timer_time), elapsed * 1000))
+        print("{:>8} {:>8} {:>10} {:>10} {:>10} {:>7} {:>9}".format(
+            "bound s", "timer ms", "recorded", "idle", "skipped", "cycles", "signals"))
+
+    for i, bound in enumerate(args.counter_bound):
+        for j, timer_time in enumerate(args.listener_timer_time):
+            row = {name: result[name][i, j] for name in result}
+            if args.json:
+                print(json.dumps({"counter_bound": float(bound),
+                                  "listener_timer_time": float(timer_time),
+                                  "recorded": round(float(row["recorded"]), 1),
+                                  "idle": round(float(row["idle"]), 1),
+                                  "skipped": round(float(row["skipped"]), 1),
+                                  "cycles": int(row["cycles"]),
+                                  "signals": int(row["signals"])}))
+            else:
+                print("{:>8g} {:>8g} {:>10} {:>10} {:>10} {:>7} {:>9}".format(
+                    bound, timer_time, hms(row["recorded"]), hms(row["idle"]),
+                    hms(row["skipped"]), int(row["cycles"]), int(row["signals"])))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
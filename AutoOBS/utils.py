@@ -1,19 +1,118 @@
+import sys
+import time
+import bisect
 import datetime
+from typing import Iterable
 
 
-def add_seconds(time: datetime.time, seconds: int) -> datetime.time:
-    return (datetime.datetime.combine(datetime.date(2021, 1, 1), time)
-            + datetime.timedelta(seconds=seconds)).time()
+DAY = 24 * 60 * 60
 
 
-def sub_seconds(time: datetime.time, seconds: int) -> datetime.time:
-    return (datetime.datetime.combine(datetime.date(2021, 1, 1), time)
-            - datetime.timedelta(seconds=seconds)).time()
+def seconds_of_day(time: datetime.time) -> float:
+    return time.hour * 3600 + time.minute * 60 + time.second + time.microsecond / 1e6
 
 
-def time_in_range(start, end, x):
-    """Return true if x is in the range [start, end]"""
-    if start <= end:
-        return start <= x <= end
-    else:
-        return start <= x or x <= end
+class Clock:
+    """Time source of the idle engine: Counter, CountWorker and ListenWorker.
+
+    The system clocks, a VirtualClock in a simulation.
+    """
+
+    # the C functions themselves, the input callbacks call monotonic for
+    # every event
+    monotonic = staticmethod(time.monotonic)
+    now = staticmethod(datetime.datetime.now)
+
+
+class VirtualClock(Clock):
+    """Clock of a simulation, it only moves when t is set"""
+
+    def __init__(self, start: datetime.datetime) -> None:
+        self.start = start
+        # s since start
+        self.t = 0.0
+
+    def monotonic(self) -> float:
+        return self.t
+
+    def now(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(seconds=self.t)
+
+
+SYSTEM_CLOCK = Clock()
+
+
+class StopSchedule:
+    """Stop time windows, stop time -/+ margin, compiled once.
+
+    The windows are kept as sorted, merged seconds of the day, split at
+    midnight, so a lookup is a bisect instead of a loop over the times.
+    """
+
+    __slots__ = ("times", "windows", "begins")
+
+    def __init__(self, times: Iterable[datetime.time], margin: float = 5) -> None:
+        self.times = tuple(sorted(times))
+
+        windows = []
+        for time in self.times:
+            begin = seconds_of_day(time) - margin
+            end = seconds_of_day(time) + margin
+            if begin < 0:
+                windows += [(begin + DAY, DAY), (0, end)]
+            elif end > DAY:
+                windows += [(begin, DAY), (0, end - DAY)]
+            else:
+                windows.append((begin, end))
+
+        merged = []
+        for begin, end in sorted(windows):
+            if merged and begin <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((begin, end))
+        self.windows = tuple(merged)
+        self.begins = tuple(begin for begin, _ in merged)
+
+    def __bool__(self) -> bool:
+        return bool(self.windows)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StopSchedule) and self.windows == other.windows
+
+    def __hash__(self) -> int:
+        return hash(self.windows)
+
+    def __repr__(self) -> str:
+        return "StopSchedule([{}])".format(", ".join(str(time) for time in self.times))
+
+    def contains(self, now: datetime.datetime) -> bool:
+        """Return true if now is in a window, the bounds included"""
+        x = seconds_of_day(now.time())
+        i = bisect.bisect_right(self.begins, x) - 1
+        return i >= 0 and x <= self.windows[i][1]
+
+    def seconds_until(self, now: datetime.datetime) -> float:
+        """Return seconds from now to the begin of the next window"""
+        x = seconds_of_day(now.time())
+        i = bisect.bisect_right(self.begins, x)
+        if i < len(self.begins):
+            return self.begins[i] - x
+        return self.begins[0] + DAY - x
+
+
+def hms(seconds: float) -> str:
+    """Return seconds as h:mm:ss"""
+    seconds = int(round(seconds))
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def peak_rss() -> float:
+    """Return the peak resident set size of this process in MiB, 0 if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
@@ -0,0 +1,341 @@
+import sys
+import time
+import logging
+
+from PyQt5.QtCore import QTimer, pyqtSlot
+from PyQt5.QtWidgets import (
+    QApplication,
+    QMainWindow,
+    QPushButton,
+    QLabel,
+    QHBoxLayout,
+    QVBoxLayout,
+    QWidget,
+    QSystemTrayIcon,
+    QAction,
+    QMenu,
+    QMessageBox
+)
+
+from AutoOBS.engine import Engine
+from AutoOBS.conf import Settings, load_conf, ConfError
+from AutoOBS.profiling import startup
+from AutoOBS.const import *
+from AutoOBS import icons
+
+
+app = None
+
+
+class Window(QMainWindow):
+
+    def __init__(self, logger: logging.Logger) -> None:
+        super().__init__()
+
+        self.engine = None
+        self.run_mode = None
+        self.logger = logger
+
+        # status pictures are loaded when first shown and cached by icons
+        begin = time.perf_counter()
+        self.stopped_icon = icons.icon(OBStatus.stopped)
+        startup.since("window: icons", begin)
+
+        # set window
+        begin = time.perf_counter()
+        self.resize(WIN_SZ_W, WIN_SZ_H)
+        self.setWindowTitle("AutoOBS")
+        self.setWindowIcon(self.stopped_icon)
+
+        central_widget = QWidget(self)
+        self.setCentralWidget(central_widget)
+
+        # set layout
+        outer_layout = QVBoxLayout()
+
+        # set status layout
+        status_layout = QHBoxLayout()
+
+        # set an image to represent status
+        self.status = QLabel(self)
+        self.status.resize(STATUS_IMG_SZ, STATUS_IMG_SZ)
+
+        # status images
+        self.status.setPixmap(icons.pixmap(OBStatus.stopped, STATUS_IMG_SZ))
+
+        status_layout.addStretch()
+        status_layout.addWidget(self.status)
+        status_layout.addStretch()
+
+        # set option layout
+        option_layout = QHBoxLayout()
+
+        # button group 1: start and stop
+        opt_ss_layout = QVBoxLayout()
+        self.start_btn = QPushButton("Start")
+        self.start_btn.clicked.connect(self.manual_start)
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.clicked.connect(self.manual_stop)
+        opt_ss_layout.addWidget(self.start_btn)
+        opt_ss_layout.addWidget(self.stop_btn)
+
+        # button group 2: resume and pause
+        opt_rp_layout = QVBoxLayout()
+        self.resume_btn = QPushButton("Resume")
+        self.resume_btn.clicked.connect(self.manual_resume)
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.clicked.connect(self.manual_pause)
+        opt_rp_layout.addWidget(self.resume_btn)
+        opt_rp_layout.addWidget(self.pause_btn)
+
+        # button group 3: manual and auto
+        opt_ma_layout = QVBoxLayout()
+        self.auto_btn = QPushButton("Auto")
+        self.auto_btn.clicked.connect(self.trigger_auto_mode)
+        self.manual_btn = QPushButton("Manual")
+        self.manual_btn.clicked.connect(self.trigger_manual_mode)
+        opt_ma_layout.addWidget(self.auto_btn)
+        opt_ma_layout.addWidget(self.manual_btn)
+    
+        option_layout.addLayout(opt_ss_layout)
+        option_layout.addStretch()
+        option_layout.addLayout(opt_rp_layout)
+        option_layout.addStretch()
+        option_layout.addLayout(opt_ma_layout)
+
+        outer_layout.addLayout(status_layout)
+        outer_layout.addLayout(option_layout)
+
+        central_widget.setLayout(outer_layout)
+
+        startup.since("window: widgets", begin)
+
+        # set tray
+        begin = time.perf_counter()
+
+        # set tray action
+        self.start_action = QAction("Start", self)
+        self.stop_action = QAction("Stop", self)
+        self.resume_action = QAction("Resume", self)
+        self.pause_action = QAction("Pause", self)
+        self.auto_action = QAction("Auto", self)
+        self.manual_action = QAction("Manual", self)
+        self.stats_action = QAction("Statistics", self)
+        self.dump_stats_action = QAction("Dump Statistics", self)
+        self.exit_action = QAction("Exit", self)
+        self.start_action.triggered.connect(self.manual_start)
+        self.stop_action.triggered.connect(self.manual_stop)
+        self.resume_action.triggered.connect(self.manual_resume)
+        self.pause_action.triggered.connect(self.manual_pause)
+        self.auto_action.triggered.connect(self.trigger_auto_mode)
+        self.manual_action.triggered.connect(self.trigger_manual_mode)
+        self.stats_action.triggered.connect(self.show_stats)
+        self.dump_stats_action.triggered.connect(self.dump_stats)
+        self.exit_action.triggered.connect(app.quit)
+
+        # set tray menu
+        tray_menu = QMenu()
+        tray_menu.addAction(self.start_action)
+        tray_menu.addAction(self.stop_action)
+        tray_menu.addSeparator()
+        tray_menu.addAction(self.resume_action)
+        tray_menu.addAction(self.pause_action)
+        tray_menu.addSeparator()
+        tray_menu.addAction(self.auto_action)
+        tray_menu.addAction(self.manual_action)
+        tray_menu.addSeparator()
+        tray_menu.addAction(self.stats_action)
+        tray_menu.addAction(self.dump_stats_action)
+        tray_menu.addSeparator()
+        tray_menu.addAction(self.exit_action)
+
+        # set tray configurations
+        self.tray = QSystemTrayIcon(self)
+        self.tray.setIcon(self.stopped_icon)
+        self.tray.setVisible(True)
+        self.tray.setContextMenu(tray_menu)
+        # self.tray.show()
+
+        # set tray click action
+        self.tray.activated.connect(self.onTrayIconActivated)
+        self.disambiguateTimer = QTimer(self)
+        self.disambiguateTimer.setSingleShot(True)
+        self.disambiguateTimer.timeout.connect(self.disambiguateTimerTimeout)
+
+        startup.since("window: tray", begin)
+
+        begin = time.perf_counter()
+        self.error_msg = QMessageBox()
+        self.error_msg.setWindowIcon(self.stopped_icon)
+        self.error_msg.setWindowTitle("Error!")
+        self.error_msg.setIcon(QMessageBox.Critical)
+        self.error_msg.setText("Error!")
+        self.error_msg.setInformativeText("Error!")
+        self.error_msg.setStandardButtons(QMessageBox.Retry | QMessageBox.Abort)
+        self.error_msg.setDefaultButton(QMessageBox.Retry)
+
+        self.stats_msg = QMessageBox()
+        self.stats_msg.setWindowIcon(self.stopped_icon)
+        self.stats_msg.setWindowTitle("Statistics")
+        self.stats_msg.setIcon(QMessageBox.Information)
+        self.stats_msg.setStandardButtons(QMessageBox.Ok)
+        startup.since("window: dialogs", begin)
+
+        self.startup_time = time.perf_counter()
+
+    def load_conf(self) -> Settings:
+        while True:
+            try:
+                return load_conf()
+            except ConfError as e:
+                self.show_error_message(str(e))
+
+    def initial(self) -> None:
+        with startup.phase("conf: load"):
+            conf = self.load_conf()
+
+        self.engine = Engine(conf, self.logger, startup_time=self.startup_time)
+        self.engine.mode_sig.connect(self.on_mode)
+        self.engine.obs_down_sig.connect(self.on_obs_down)
+        self.engine.start()
+
+        # Engine tracks the connection, its slot runs first
+        self.engine.obs.connect_wait_done_sig.connect(
+            lambda ret: self.update_ui(self.engine.obs.status))
+        self.engine.obs.ui_update_sig.connect(lambda status: self.update_ui(status))
+        for thread in self.engine.threads:
+            thread.finished.connect(app.exit)
+
+    @pyqtSlot(str)
+    def on_obs_down(self, names: str) -> None:
+        self.tray.showMessage("AutoOBS", "Can not connect to the OBS Studio ({}), retrying..."
+                              .format(names), QSystemTrayIcon.Warning)
+
+    def show_error_message(self, info: str) -> None:
+        self.error_msg.setInformativeText(info)
+
+        ret = self.error_msg.exec()
+        if ret == QMessageBox.Abort:
+            sys.exit(app.exit())
+
+    def stats_text(self) -> str:
+        return self.engine.stats_text()
+
+    def show_stats(self) -> None:
+        self.stats_msg.setText("<pre>{}</pre>".format(self.stats_text()))
+        # not modal, the numbers are a snapshot
+        self.stats_msg.show()
+
+    def dump_stats(self) -> None:
+        self.engine.dump_stats()
+
+    # override closeEvent to implement closing to tray
+    def closeEvent(self, event) -> None:
+        event.ignore()
+        self.hide()
+
+    def onTrayIconActivated(self, reason) -> None:
+        print("onTrayIconActivated:", reason)
+        if reason == QSystemTrayIcon.Trigger:
+            self.disambiguateTimer.start(app.doubleClickInterval())
+        elif reason == QSystemTrayIcon.DoubleClick:
+            self.disambiguateTimer.stop()
+
+            self.logger.debug("Tray icon double clicked.")
+            if self.isVisible():
+                self.hide()
+            else:
+                self.show()
+
+    def disambiguateTimerTimeout(self) -> None:
+        self.logger.debug("Tray icon single clicked.")
+
+    def set_title(self, status: int) -> None:
+        self.setWindowTitle("AutoOBS | " + self.run_mode +
+                                   " | " + (status_to_str[status] if self.engine.obs_connected
+                                            else "connecting"))
+
+    @pyqtSlot()
+    def update_ui(self, status: int) -> None:
+        self.status.setPixmap(icons.pixmap(status, STATUS_IMG_SZ))
+        self.tray.setIcon(icons.icon(status))
+        self.tray.setToolTip(self.engine.obs.summary())
+        self.set_title(status)
+
+    # methods for manual mode
+    def manual_start(self) -> None:
+        self.engine.manual("start")
+
+    def manual_resume(self) -> None:
+        self.engine.manual("resume")
+
+    def manual_pause(self) -> None:
+        self.engine.manual("pause")
+
+    def manual_stop(self) -> None:
+        self.engine.manual("stop")
+
+    # change to auto mode
+    def trigger_auto_mode(self) -> None:
+        self.engine.set_mode("auto")
+
+    # change to manual mode
+    def trigger_manual_mode(self) -> None:
+        self.engine.set_mode("manual")
+
+    @pyqtSlot(str)
+    def on_mode(self, mode: str) -> None:
+        self.run_mode = mode
+        self.update_ui(self.engine.obs.status)
+        if mode == "auto":
+            self.auto_ui()
+        else:
+            self.manual_ui()
+
+    def auto_ui(self) -> None:
+
+        self.start_btn.setEnabled(False)
+        self.stop_btn.setEnabled(False)
+        self.resume_btn.setEnabled(False)
+        self.pause_btn.setEnabled(False)
+        self.auto_btn.setEnabled(False)
+        self.manual_btn.setEnabled(True)
+
+        self.start_action.setEnabled(False)
+        self.stop_action.setEnabled(False)
+        self.resume_action.setEnabled(False)
+        self.pause_action.setEnabled(False)
+        self.auto_action.setEnabled(False)
+        self.manual_action.setEnabled(True)
+
+    def manual_ui(self) -> None:
+
+        self.start_btn.setEnabled(True)
+        self.stop_btn.setEnabled(True)
+        self.resume_btn.setEnabled(True)
+        self.pause_btn.setEnabled(True)
+        self.auto_btn.setEnabled(True)
+        self.manual_btn.setEnabled(False)
+
+        self.start_action.setEnabled(True)
+        self.stop_action.setEnabled(True)
+        self.resume_action.setEnabled(True)
+        self.pause_action.setEnabled(True)
+        self.auto_action.setEnabled(True)
+        self.manual_action.setEnabled(False)
+
+
+def run(logger: logging.Logger, startup_time: float) -> int:
+    global app
+    with startup.phase("window: QApplication"):
+        app = QApplication(sys.argv)
+    with startup.phase("window: construct"):
+        window = Window(logger)
+    window.startup_time = startup_time
+    with startup.phase("window: show"):
+        window.show()
+    with startup.phase("window: initial"):
+        window.initial()
+    ret = app.exec()
+    window.engine.stop()
+    return ret
@@ -1,43 +1,55 @@
+import math
 import time
-import datetime
 import logging
-from typing import List
 
-import pynput
 from PyQt5.QtCore import (
     pyqtSignal,
     pyqtSlot,
     QObject,
-    QMutex,
-    QTimer
+    QTimer,
+    Qt,
 )
 
-from AutoOBS.utils import time_in_range, add_seconds, sub_seconds
+from AutoOBS.const import JOURNAL_BURST_GAP
+from AutoOBS.utils import Clock, StopSchedule, SYSTEM_CLOCK
+from AutoOBS.journal import Journal
+from AutoOBS.profiling import startup
+from AutoOBS.tracing import tracer
+
+
+# input event types, counted per type for the metrics
+INPUT_EVENTS = ("press", "release", "move", "click", "scroll")
 
 
 class Counter:
 
-    def __init__(self, bound: int, logger: logging.Logger) -> None:
+    def __init__(self, bound: int, logger: logging.Logger, clock: Clock = SYSTEM_CLOCK) -> None:
         self.logger = logger
+        self.clock = clock
 
         self.bound = bound
-        self.count = bound
-        self.overflow = False
-        self.mutex = QMutex()
+        # written by the input listener threads without any lock, a single
+        # float store is atomic under the GIL and readers only need the
+        # latest value
+        self.last_activity = clock.monotonic()
+        # set by CountWorker when the counter overflows, cleared by the
+        # listener with the first activity after it
+        self.idle = False
+
+    @property
+    def idle_time(self) -> float:
+        return self.clock.monotonic() - self.last_activity
+
+    @property
+    def count(self) -> float:
+        return max(self.bound - self.idle_time, 0)
+
+    @property
+    def overflow(self) -> bool:
+        return self.idle_time >= self.bound
 
     def reset(self) -> None:
-        self.mutex.lock()
-        self.count = self.bound
-        self.overflow = False
-        self.mutex.unlock()
-
-    def dec(self) -> None:
-        if self.overflow == False:
-            self.mutex.lock()
-            self.count -= 1
-            if self.count == 0:
-                self.overflow = True
-            self.mutex.unlock()
+        self.last_activity = self.clock.monotonic()
 
 
 class CountWorker(QObject):
@@ -45,126 +57,254 @@ class CountWorker(QObject):
     pause = pyqtSignal()
     stop = pyqtSignal()
 
-    def __init__(self, intvl: int, stop_times: List[datetime.time],
-                 counter: Counter, logger: logging.Logger) -> None:
+    # timer is the VirtualTimer of a simulation, which calls timeout itself
+    def __init__(self, schedule: StopSchedule, counter: Counter,
+                 journal: Journal, logger: logging.Logger, timer=None) -> None:
         super().__init__()
 
         self.logger = logger
+        self.journal = journal
 
-        self.intvl = intvl
         self.counter = counter
-
-        self.stop_flag = False
-        self.stop_times = []
-        if len(stop_times) > 0:
-            self.stop_flag = True
-            for item in stop_times:
-                self.stop_times.append((sub_seconds(item, 5),
-                                        add_seconds(item, 5)))
+        # the clock of the counter tells the time of day too
+        self.clock = counter.clock
+
+        self.schedule = schedule
+
+        # one single shot timer armed for the next deadline only, instead of
+        # waking up every counter_interval
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setTimerType(Qt.PreciseTimer)
+            timer.timeout.connect(self.timeout)
+        self.timer = timer
+
+        self.active = False
+        # overflows that paused or stopped OBS, only written in this thread
+        self.overflows = {"pause": 0, "stop": 0}
+        # perf_counter() when the timer was armed, the sleep in a trace
+        self.armed = 0.0
+        # number of timer wakeups, to measure the scheduler
+        self.wakeups = 0
+
+    @property
+    def stop_flag(self) -> bool:
+        return bool(self.schedule)
 
     def check_time(self) -> bool:
-        if not self.stop_flag:
-            return False
-
-        now = datetime.datetime.now().time()
-        for item in self.stop_times:
-            if time_in_range(item[0], item[1], now):
-                return True
+        return self.schedule.contains(self.clock.now())
+
+    def next_stop_time(self) -> float:
+        return self.schedule.seconds_until(self.clock.now())
+
+    # a reload of conf.toml, the counter bound may have changed too, idle
+    # state and activity are kept
+    @pyqtSlot(object)
+    @tracer.traced("count")
+    def set_schedule(self, schedule: StopSchedule) -> None:
+        self.schedule = schedule
+        if not self.active:
+            return
+        if not self.counter.idle:
+            self._arm(self.counter.count)
+        elif self.stop_flag:
+            self._arm(self.next_stop_time() + 1)
+        else:
+            self.timer.stop()
 
-        return False
+    def _arm(self, seconds: float) -> None:
+        self.armed = time.perf_counter()
+        self.timer.start(max(math.ceil(seconds * 1000), 0))
 
     @pyqtSlot()
     def run(self) -> None:
-        while (True):
-            time.sleep(self.intvl)
-
-            self.logger.debug("Counter number: {}.".format(self.counter.count))
+        tracer.name_thread("count")
+        self.set_active(True)
 
-            if self.counter.overflow:
-                self.logger.debug("Counter overflow.")
-                if self.check_time():
-                    self.logger.debug("Time to stop working, emit stop.")
+    # the count thread is finishing, see Engine.stop
+    @pyqtSlot()
+    def shutdown(self) -> None:
+        self.timer.stop()
+
+    @pyqtSlot(bool)
+    @tracer.traced("count")
+    def set_active(self, active: bool) -> None:
+        self.active = active
+        if active:
+            self.counter.idle = False
+            self._arm(self.counter.count)
+        else:
+            self.timer.stop()
 
-                    self.stop.emit()
-                else:
-                    self.logger.debug("Normal time, emit pause.")
+    # the listener found activity after the counter overflowed
+    @pyqtSlot()
+    @tracer.traced("count")
+    def wake(self) -> None:
+        if self.active:
+            self._arm(self.counter.count)
 
-                    self.pause.emit()
-            else:
-                self.counter.dec()
+    @pyqtSlot()
+    @tracer.traced("count")
+    def timeout(self) -> None:
+        tracer.complete("CountWorker.sleep", "sleep", self.armed, time.perf_counter())
+        self.wakeups += 1
+        self.logger.debug("Counter wakeup {}, idle for {:.3f}s."
+                          .format(self.wakeups, self.counter.idle_time))
+
+        if not self.counter.overflow:
+            # activity since the timer was armed, move to the new deadline
+            self._arm(self.counter.count)
+            return
+
+        self.logger.debug("Counter overflow.")
+        if self.check_time():
+            self.logger.debug("Time to stop working, emit stop.")
+            self.journal.overflow(True, self.counter.idle_time)
+            self.overflows["stop"] += 1
+
+            # paused_then_stop only stops a paused OBS, one that still
+            # records is paused first, the same overflow
+            if not self.counter.idle:
+                self.counter.idle = True
+                tracer.instant("CountWorker.pause", "signal")
+                self.pause.emit()
+
+            tracer.instant("CountWorker.stop", "signal")
+            self.stop.emit()
+            return
+
+        if not self.counter.idle:
+            self.logger.debug("Normal time, emit pause.")
+            self.journal.overflow(False, self.counter.idle_time)
+            self.overflows["pause"] += 1
+            self.counter.idle = True
+
+            tracer.instant("CountWorker.pause", "signal")
+            self.pause.emit()
+
+        # still idle when the next stop time comes
+        if self.stop_flag:
+            self._arm(self.next_stop_time() + 1)
 
 
 class ListenWorker(QObject):
 
-    resume_sig = pyqtSignal()
-    timer_start_sig = pyqtSignal()
+    # monotonic time of the input event
+    resume_sig = pyqtSignal(float)
+    active_sig = pyqtSignal()
 
-    def __init__(self, timer_time: int,
-                 counter: Counter, logger: logging.Logger) -> None:
+    def __init__(self, timer_time: int, counter: Counter,
+                 journal: Journal, logger: logging.Logger) -> None:
         super().__init__()
 
-        self.timer_time = timer_time
+        self.timer_time = None
+        self.set_timer_time(timer_time)
 
         self.logger = logger
+        # checked once, the input callbacks below run for every event and
+        # must not format a message that is dropped at INFO
+        self.debug = logger.isEnabledFor(logging.DEBUG)
 
         self.counter = counter
+        # bound once, on_event reads it for every event
+        self.monotonic = counter.clock.monotonic
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.timer_timeout)
-        self.timer_start_sig.connect(self.timer_start)
-        self.timeout_flag = False
-        self.timer.start(timer_time)
+        self.resume_at = 0.0
 
-    def on_event(self) -> None:
-        if self.timeout_flag:
-            self.logger.debug("Reset counter and emit resume.")
+        # events per type, every type is only counted by its own listener
+        # thread, keyboard or mouse, so the increments need no lock
+        self.inputs = dict.fromkeys(INPUT_EVENTS, 0)
 
-            self.timer_start_sig.emit()
+        # the current activity burst, journaled once it is over
+        self.journal = journal
+        self.burst_begin = counter.last_activity
+        self.burst_events = 0
 
-            self.counter.reset()
-            self.resume_sig.emit()
-        else:
-            self.logger.debug("Timer is not overflow, will not emit resume.")
+    # ms in conf.toml, s on the monotonic clock, a single store read by the
+    # pynput threads
+    def set_timer_time(self, timer_time: int) -> None:
+        self.timer_time = timer_time / 1000
+
+    # called from the pynput threads for every input event, so keep it to a
+    # timestamp store and a compare, resume is emitted at most once per
+    # timer_time
+    @tracer.traced("input")
+    def on_event(self) -> None:
+        now = self.monotonic()
+        if now - self.counter.last_activity > JOURNAL_BURST_GAP:
+            self.end_burst()
+            self.burst_begin = now
+        self.burst_events += 1
+        self.counter.last_activity = now
+
+        if now >= self.resume_at:
+            self.resume_at = now + self.timer_time
+
+            if self.counter.idle:
+                self.counter.idle = False
+                self.active_sig.emit()
+
+            if self.debug:
+                self.logger.debug("Emit resume.")
+            tracer.instant("ListenWorker.resume_sig", "signal")
+            self.resume_sig.emit(now)
+
+    def end_burst(self) -> None:
+        if self.burst_events:
+            self.journal.activity(self.burst_begin, self.counter.last_activity,
+                                  self.burst_events)
+        self.burst_events = 0
 
     def on_press(self, key) -> None:
-        self.logger.debug("Key {} pressed.".format(key))
+        self.inputs["press"] += 1
+        if self.debug:
+            self.logger.debug("Key {} pressed.".format(key))
         self.on_event()
 
     def on_release(self, key) -> None:
-        self.logger.debug("Key {} released.".format(key))
+        self.inputs["release"] += 1
+        if self.debug:
+            self.logger.debug("Key {} released.".format(key))
         self.on_event()
 
     def on_move(self, x, y) -> None:
-        self.logger.debug("Mouse moved to ({}, {}).".format(x, y))
+        self.inputs["move"] += 1
+        if self.debug:
+            self.logger.debug("Mouse moved to ({}, {}).".format(x, y))
         self.on_event()
 
     def on_click(self, x, y, button, pressed) -> None:
-        self.logger.debug("Mouse button {} {} on ({}, {})."
-                            .format(button, "pressed" if pressed else "released", x, y))
+        self.inputs["click"] += 1
+        if self.debug:
+            self.logger.debug("Mouse button {} {} on ({}, {})."
+                              .format(button, "pressed" if pressed else "released", x, y))
         self.on_event()
 
     def on_scroll(self, x, y, dx, dy) -> None:
-        self.logger.debug("Mouse scrolled to ({}, {}), dx, dy: ({}, {})."
-                            .format(x, y, dx, dy))
+        self.inputs["scroll"] += 1
+        if self.debug:
+            self.logger.debug("Mouse scrolled to ({}, {}), dx, dy: ({}, {})."
+                              .format(x, y, dx, dy))
         self.on_event()
 
-    def timer_start(self) -> None:
-        self.timeout_flag = False
-        self.timer.start(self.timer_time)
-
-    def timer_timeout(self) -> None:
-        self.timeout_flag = True
-
     @pyqtSlot()
     def run(self) -> None:
+        tracer.name_thread("listen")
+        # pynput needs an input backend, the simulation and the offline
+        # tools import this module without one
+        import pynput
         key_listener = pynput.keyboard.Listener(on_press=self.on_press,
                                                 on_release=self.on_release)
         mouse_listener = pynput.mouse.Listener(on_move=self.on_move,
                                                on_click=self.on_click,
                                                on_scroll=self.on_scroll)
-        
-        key_listener.start()
-        mouse_listener.start()
+        key_listener.name = "pynput keyboard"
+        mouse_listener.name = "pynput mouse"
+
+        with startup.phase("listener: input listeners start"):
+            key_listener.start()
+            mouse_listener.start()
 
         # key_listener.join()
         # mouse_listener.join()
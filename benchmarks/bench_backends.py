@@ -0,0 +1,83 @@
+"""Command throughput of the Obsws, AsyncObsws and AsyncObsws5 backends.
+
+Every backend drives the bundled MockObsServer over localhost, alternating
+PauseRecording and ResumeRecording. Obsws, the synchronous backend of
+ObsWorker, waits for every reply before the next request, AsyncObsws and
+AsyncObsws5 keep up to --window requests in flight. The plain
+obswebsocket.obsws it derives from, which polls for its replies, is
+measured too, for reference.
+
+    python -m benchmarks.bench_backends --count 200 --latency 0.005
+"""
+import time
+import argparse
+from collections import deque
+
+from obswebsocket import obsws, requests
+
+from AutoOBS.obs_sync import Obsws
+from AutoOBS.obs_async import AsyncObsws
+from AutoOBS.obs_v5 import AsyncObsws5
+from AutoOBS.mock_obs import MockObsServer
+
+
+def commands(count: int):
+    for i in range(count):
+        yield requests.PauseRecording() if i % 2 == 0 else requests.ResumeRecording()
+
+
+def bench_sync(cls, port: int, count: int) -> float:
+    ws = cls("localhost", port, "")
+    ws.connect()
+    try:
+        begin = time.perf_counter()
+        for req in commands(count):
+            ws.call(req)
+        return time.perf_counter() - begin
+    finally:
+        ws.disconnect()
+
+
+def bench_async(cls, port: int, count: int, window: int) -> float:
+    ws = cls("localhost", port, "")
+    ws.connect()
+    try:
+        inflight = deque()
+        begin = time.perf_counter()
+        for req in commands(count):
+            if len(inflight) >= window:
+                inflight.popleft().result()
+            inflight.append(ws.call_async(req))
+        for future in inflight:
+            future.result()
+        return time.perf_counter() - begin
+    finally:
+        ws.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="obs-websocket backend throughput")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="reply delay of the mock server, s")
+    parser.add_argument("--window", type=int, default=16,
+                        help="requests in flight for AsyncObsws")
+    args = parser.parse_args()
+
+    runs = (("Obsws", 4, lambda port: bench_sync(Obsws, port, args.count)),
+            ("AsyncObsws", 4, lambda port: bench_async(AsyncObsws, port, args.count, args.window)),
+            ("AsyncObsws5", 5, lambda port: bench_async(AsyncObsws5, port, args.count, args.window)),
+            ("obsws (lib)", 4, lambda port: bench_sync(obsws, port, args.count)))
+    for name, protocol, run in runs:
+        server = MockObsServer(latency=args.latency, protocol=protocol)
+        port = server.start()
+        server.recording = True
+        try:
+            elapsed = run(port)
+        finally:
+            server.stop()
+        print("{:<12} {:>6} commands in {:8.3f}s, {:10.1f} commands/s"
+              .format(name, args.count, elapsed, args.count / elapsed))
+
+if __name__ == "__main__":
+    main()
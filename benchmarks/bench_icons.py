@@ -0,0 +1,67 @@
+"""Time to make the status icons available, compiled module against .rcc.
+
+Every run starts a fresh interpreter that imports PyQt5 first, so only the
+resource loading itself is timed: importing the compiled resources.py
+module, or registering the memory-mapped resources.rcc. The time to the
+first scaled status pixmap is measured as well. "cold" runs point
+PYTHONPYCACHEPREFIX at an empty directory, like the first start after an
+install, so resources.py is compiled again. Qt runs offscreen.
+
+    python -m benchmarks.bench_icons --runs 20
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+
+SCRIPT = """
+import sys, json, time
+from PyQt5.QtCore import QResource
+from PyQt5.QtGui import QGuiApplication, QPixmap
+from AutoOBS.resources import RCC_FILE
+app = QGuiApplication([])
+
+begin = time.perf_counter()
+if sys.argv[1] == "module":
+    from AutoOBS.resources import resources
+else:
+    QResource.registerResource(RCC_FILE)
+loaded = time.perf_counter()
+QPixmap(":icons/stopped.png").scaled(128, 128)
+shown = time.perf_counter()
+print(json.dumps([loaded - begin, shown - begin]))
+"""
+
+
+def run_once(source: str, env: dict, cold: bool) -> list:
+    if cold:
+        with tempfile.TemporaryDirectory() as prefix:
+            return run_once(source, dict(env, PYTHONPYCACHEPREFIX=prefix), False)
+    out = subprocess.run([sys.executable, "-c", SCRIPT, source], env=env, check=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return json.loads(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AutoOBS icon resource loading time")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen",
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+    for cold in (False, True):
+        for source in ("module", "rcc"):
+            results = [run_once(source, env, cold) for _ in range(args.runs)]
+            loaded, shown = (statistics.median(column) for column in zip(*results))
+            print("{:<5} {:<7} loaded {:7.2f}ms  first pixmap {:7.2f}ms"
+                  .format("cold" if cold else "warm", source, loaded * 1000, shown * 1000))
+
+
+if __name__ == "__main__":
+    main()
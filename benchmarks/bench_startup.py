@@ -0,0 +1,77 @@
+"""Startup time and memory of the GUI and the headless mode.
+
+Every run starts `python -m AutoOBS --stdout` in a temporary directory
+with a conf.toml pointing at the bundled MockObsServer, reads the startup
+lines it logs and terminates it. Qt runs offscreen and pynput with its dummy
+backend, so no display is needed.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import os
+import re
+import sys
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from AutoOBS.mock_obs import MockObsServer
+
+
+INTERACTIVE = re.compile(r"Startup: interactive after ([\d.]+)s, peak RSS ([\d.]+) MiB")
+CONNECTED = re.compile(r"Startup: connected to OBS after ([\d.]+)s")
+
+
+def run_once(args: list, cwd: str, env: dict) -> tuple:
+    proc = subprocess.Popen([sys.executable, "-m", "AutoOBS", "--stdout"] + args, cwd=cwd,
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    interactive = rss = connected = None
+    try:
+        for line in proc.stdout:
+            match = INTERACTIVE.search(line)
+            if match:
+                interactive, rss = float(match.group(1)), float(match.group(2))
+            match = CONNECTED.search(line)
+            if match:
+                connected = float(match.group(1))
+            if interactive is not None and connected is not None:
+                break
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    return interactive, connected, rss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AutoOBS startup time and peak RSS")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server = MockObsServer()
+    port = server.start()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", PYNPUT_BACKEND="dummy",
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+    try:
+        with tempfile.TemporaryDirectory() as cwd:
+            with open(os.path.join(cwd, "conf.toml"), "w", encoding="utf-8") as f:
+                f.write("[obs]\nhost = \"localhost\"\nport = {}\npassword = \"\"\n".format(port))
+
+            for name, mode_args in (("gui", []), ("headless", ["--headless"])):
+                results = [run_once(mode_args, cwd, env) for _ in range(args.runs)]
+                interactive, connected, rss = (statistics.median(column) for column in zip(*results))
+                print("{:<9} interactive {:7.3f}s  connected {:7.3f}s  peak RSS {:6.1f} MiB"
+                      .format(name, interactive, connected, rss))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-pyinstaller -w -F -p .\AutoOBS --name AutoOBS --icon=.\AutoOBS\resources\raw\images\obs-studio.ico .\AutoOBS\__main__.py
+pyinstaller -w -F -p .\AutoOBS --name AutoOBS --icon=.\AutoOBS\resources\raw\images\obs-studio.ico --add-data ".\AutoOBS\resources\resources.rcc;AutoOBS\resources" .\AutoOBS\__main__.py
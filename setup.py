@@ -50,5 +50,7 @@ setup(
     },
 
     install_requires=REQU,
+    # python -m AutoOBS.tune
+    extras_require={'tune': ['numpy']},
     include_package_data=True,
 )
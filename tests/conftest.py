@@ -0,0 +1,28 @@
+import os
+import time
+
+# no input devices and no display on CI, set before pynput and Qt load
+os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+
+@pytest.fixture(scope="session")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def wait(app):
+    """Process Qt events until predicate() is true, False after timeout s"""
+    def wait_until(predicate, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                return False
+            app.processEvents()
+            time.sleep(0.005)
+        return True
+    return wait_until
@@ -0,0 +1,131 @@
+import logging
+
+import pytest
+
+from AutoOBS.const import OBStatus
+from AutoOBS.journal import Journal
+from AutoOBS.mock_obs import MockObsServer
+from AutoOBS.obs_thread import ObsWorker
+
+
+PASSWORD = "secret"
+
+# backend of ObsWorker, protocol of the server
+BACKENDS = (("obsws", 4), ("asyncio", 4), ("v5", 5))
+
+
+@pytest.fixture(params=BACKENDS, ids=[backend for backend, _ in BACKENDS])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def server(backend):
+    server = MockObsServer(protocol=backend[1], password=PASSWORD)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_worker(app, backend, server):
+    workers = []
+
+    def make(password: str = PASSWORD) -> ObsWorker:
+        worker = ObsWorker(Journal(None, capacity=1), logging.getLogger("AutoOBS.test"))
+        worker.set_backend(backend[0])
+        worker.set_connect("localhost", server.port, password)
+        workers.append(worker)
+        return worker
+
+    yield make
+    for worker in workers:
+        worker.shutdown()
+        try:
+            worker.ws.disconnect()
+        except Exception:
+            pass
+
+
+def test_commands(server, make_worker, wait):
+    worker = make_worker()
+    worker.ws_connect()
+    assert worker.connected
+    assert worker.status == OBStatus.stopped
+
+    worker.start()
+    assert wait(lambda: server.recording and worker.status == OBStatus.recording)
+    worker.pause()
+    assert wait(lambda: server.paused and worker.status == OBStatus.paused)
+    worker.resume_or_start()
+    assert wait(lambda: not server.paused and worker.status == OBStatus.recording)
+    # already recording, OBS is not asked again
+    worker.resume_or_start()
+    assert wait(lambda: worker.state.satisfied.get("resume_or_start") == 1)
+    worker.pause()
+    worker.paused_then_stop()
+    assert wait(lambda: not server.recording and worker.status == OBStatus.stopped)
+    assert worker.state.sent.get("StartRecording") == 1
+    assert worker.state.sent.get("ResumeRecording") == 1
+
+
+def test_wrong_password(server, make_worker):
+    worker = make_worker("wrong")
+    worker.ws_connect()
+    assert not worker.connected
+    assert worker.attempts == 1
+    assert worker.reconnect_timer.isActive()
+    assert not server.requests("StartRecording")
+
+
+def timeouts(worker: ObsWorker) -> int:
+    return sum(stats["timeout"] for stats in worker.stats.as_dict().values())
+
+
+def test_dropped_request(server, make_worker, wait):
+    worker = make_worker()
+    # a v5 batch waits as long as its slowest request
+    worker.set_deadlines({"StartRecording": 0.3, "GetRecordingStatus": 0.3}, 5)
+    worker.ws_connect()
+
+    server.drop_next()
+    worker.start()
+    # OBS never got it, the worker takes over the status OBS reports
+    assert wait(lambda: timeouts(worker) == 1)
+    assert wait(lambda: not worker.state.inflight)
+    assert worker.status == OBStatus.stopped
+    assert worker.connected
+
+    worker.start()
+    assert wait(lambda: server.recording and worker.status == OBStatus.recording)
+
+
+def test_frozen_server(server, make_worker, wait):
+    worker = make_worker()
+    worker.set_deadlines({"StartRecording": 0.3, "GetRecordingStatus": 0.3}, 5)
+    worker.ws_connect()
+
+    # the status query after the timeout times out as well
+    server.freeze()
+    worker.start()
+    assert wait(lambda: timeouts(worker) >= 2)
+    assert wait(lambda: not worker.state.inflight)
+
+    # OBS reads the request late, its event brings the worker along
+    server.thaw()
+    assert wait(lambda: server.recording and worker.status == OBStatus.recording)
+
+
+def test_reconnect(server, make_worker, wait):
+    worker = make_worker()
+    worker.ws_connect()
+    worker.start()
+    assert wait(lambda: worker.status == OBStatus.recording)
+
+    server.disconnect()
+    assert wait(lambda: worker.disconnects == 1 and not worker.connected)
+    # OBS went on while AutoOBS was away
+    server.paused = True
+    assert wait(lambda: worker.connected, timeout=10)
+    assert worker.reconnects == 1
+    assert worker.status == OBStatus.paused
@@ -0,0 +1,39 @@
+import os
+import datetime
+
+from AutoOBS.simulate import check, load_scenario, run_scenario
+
+
+WORKDAY = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "workday.toml")
+
+
+def test_workday():
+    scenario = load_scenario(WORKDAY)
+    transitions = list(run_scenario(scenario).transitions())
+    assert check(transitions, scenario["expect"], scenario.get("tolerance", 1)) == []
+
+
+def test_check_reports_differences():
+    start = datetime.datetime(2026, 1, 5, 8)
+    simulation = run_scenario({"start": start, "hours": 1, "counter_bound": 10,
+                               "activity": [{"begin": start,
+                                             "end": start + datetime.timedelta(minutes=5)}]})
+    transitions = list(simulation.transitions())
+    assert [step.status for step in transitions] == ["recording", "paused"]
+
+    errors = check(transitions, [{"at": start, "status": "recording"}], 1)
+    assert len(errors) == 1 and errors[0].startswith("unexpected paused")
+
+
+def test_idle_first_in_stop_window():
+    # the bound runs out at 00:59:57, inside the stop window of 01:00
+    start = datetime.datetime(2026, 1, 5, 0, 59, 30)
+    simulation = run_scenario({"start": start, "hours": 1, "counter_bound": 10,
+                               "stop_times": [datetime.time(1, 0)],
+                               "activity": [{"begin": start,
+                                             "end": start + datetime.timedelta(seconds=17)}]})
+    transitions = list(simulation.transitions())
+    assert [(step.status, step.time.time()) for step in transitions] == [
+        ("recording", datetime.time(0, 59, 30)),
+        ("paused", datetime.time(0, 59, 57)),
+        ("stopped", datetime.time(0, 59, 57))]
@@ -0,0 +1,23 @@
+import time
+
+from AutoOBS.state import CommandBoard
+
+
+def test_deadline_per_board():
+    short, long = CommandBoard(deadline=0.05), CommandBoard(deadline=10)
+    command = short.make("pause")
+    short.post(command)
+    long.post(command)
+
+    time.sleep(0.1)
+    assert short.claim(command) == "expired"
+    assert long.claim(command) is None
+
+
+def test_seq_shared_by_boards():
+    first, second = CommandBoard(), CommandBoard()
+    older = first.make("pause")
+    newer = second.make("pause")
+    first.post(older)
+    first.post(newer)
+    assert first.claim(older) == "superseded by pause"